@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for the simulation engines.
+"""
+## Time every simulation engine of the droplet and forest fire models, and
+## the spontaneous forest fire, over a range of grid sizes and densities
+## below, at and above the transition, with animation on and off.
+##
+## Each case runs in its own process, so that a case which takes too long
+## can be stopped, and is repeated with twice the replications until it has
+## run for at least 'min_time' seconds.  The realisations per second and
+## cells per second are printed and appended, with the current commit, to
+## the history file so that regressions show up between commits.
+##
+## Run "python Benchmarks.py" for every case, or name models and engines,
+## e.g. "python Benchmarks.py forest unionfind", to run only those.  With
+## "smoke" among them, e.g. "python Benchmarks.py smoke", each case is run
+## just once on the smallest grid, nothing is recorded, and the exit status
+## is 1 when any case fails, so that a broken engine is caught quickly.
+import os
+import json
+import time
+import tempfile
+import subprocess
+import importlib
+import importlib.util
+from sys import argv
+from multiprocessing import Process, Queue
+
+# the benchmarks never show a window, whatever the default backend
+os.environ.setdefault("MPLBACKEND", "Agg")
+import numpy as np
+
+here = os.path.dirname(os.path.abspath(__file__))
+history = os.path.join(here, "benchmarks.jsonl")
+
+# Densities of rock in the sand, or mud in the forest, below, at and above
+# the transition of each model
+densities = {"droplet": [0.1, 0.3, 0.6],
+             "forest": [0.3, 0.6, 0.8],
+             "spontaneous": [0.3, 0.6, 0.8]}
+
+# Model, engine, the script or package module holding it and whether it animates
+engines = [
+    ("droplet", "python", "Stochastic System.py", True),
+    ("droplet", "batch", "percolate.droplet", False),
+    ("droplet", "compiled", "percolate.droplet", False),
+    ("droplet", "packed", "percolate.droplet", False),
+    ("forest", "bfs", "Forest Fire Critical Percolation.py", False),
+    ("forest", "bfs", "Forest Fire Critical Percolation.py", True),
+    ("forest", "unionfind", "percolate.forest", False),
+    ("forest", "compiled", "percolate.forest", False),
+    ("forest", "packed", "percolate.forest", False),
+    ("forest", "ndimage", "percolate.forest", False),
+    ("forest", "newman-ziff", "percolate.forest", False),
+    ("spontaneous", "iterate", "Spontaneous Forest Fire.py", False),
+    ("spontaneous", "iterate", "Spontaneous Forest Fire.py", True),
+    ("spontaneous", "drossel-schwabl", "Spontaneous Forest Fire.py", False),
+]
+
+
+def load(filename):
+    ## Imports one of the simulation scripts, or a module of the package, as
+    ## a module.
+    if not filename.endswith(".py"):
+        return importlib.import_module(filename)
+    name = os.path.splitext(filename)[0].replace(" ", "_").lower()
+    spec = importlib.util.spec_from_file_location(name, os.path.join(here, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def available(module, engine):
+    ## Whether the optional dependency of an engine is installed.
+    if engine == "compiled":
+        return module.njit is not None
+    if engine == "ndimage":
+        return module.ndimage is not None
+    return True
+
+
+def run(module, model, engine, animate, p, N, nrep):
+    ## Runs nrep realisations of one engine on an N by N grid.
+    if model == "droplet":
+        if engine == "python":
+            return module.simulation(p, N, nrep, animate, True)
+        if engine == "batch":
+            return module.simulation_batch(p, N, nrep)
+        if engine == "compiled":
+            return module.simulation_compiled(p, N, nrep)
+        return module.simulation_packed(p, N, nrep)
+    if model == "forest":
+        if engine == "bfs":
+            NB = module.simulation(p, N, N, nrep, animate, True)
+            if animate:
+                module.create_animation()
+            return NB
+        if engine == "unionfind":
+            return module.simulation_unionfind(p, N, N, nrep)
+        if engine == "compiled":
+            return module.simulation_compiled(p, N, N, nrep)
+        if engine == "packed":
+            return module.simulation_packed(p, N, N, nrep)
+        if engine == "ndimage":
+            return module.simulation_label(p, N, N, nrep)
+        return module.simulation_newman_ziff(N, N, nrep)
+    # A realisation of the Drossel-Schwabl forest fire is 100 generations.
+    if engine == "drossel-schwabl":
+        return module.drossel_schwabl(N, N, 0.05, 1e-4, 100 * nrep, every=100 * nrep)
+    # The spontaneous forest fire has no replications of its own.
+    for j in range(nrep):
+        X = np.random.choice([0, 1], size=N * N, p=[1-p, p]).reshape(N, N)
+        X[N//2, N//2] = 2
+        module.iterate(X, N, N, 0.7, animate)
+
+
+def run_case(filename, model, engine, animate, p, N, min_time, queue):
+    ## Times one case, in a directory of its own so that any animation it
+    ## writes does not land in the repository.
+    try:
+        module = load(filename)
+        os.chdir(tempfile.mkdtemp())
+        if not available(module, engine):
+            queue.put(None)
+            return
+        # warm up, so that compiling a kernel is not timed
+        run(module, model, engine, animate, p, N, 1)
+        nrep = 1
+        while True:
+            start = time.perf_counter()
+            run(module, model, engine, animate, p, N, nrep)
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+            nrep *= 2
+        queue.put((nrep, elapsed))
+    except Exception as error:
+        # a case which fails is reported, not mistaken for one skipped
+        queue.put(("error", repr(error)))
+
+
+def commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=here,
+                              capture_output=True, text=True).stdout.strip() or "unknown"
+    except OSError:
+        return "unknown"
+
+
+def previous_rates():
+    ## The most recent rate recorded for every case in the history.
+    rates = {}
+    if os.path.exists(history):
+        with open(history) as log:
+            for line in log:
+                record = json.loads(line)
+                if record["realisations_per_second"] is not None:
+                    rates[record["case"]] = record["realisations_per_second"]
+    return rates
+
+
+def main():
+    # Grid sizes, and the smaller ones used when animating
+    sizes = [10, 50, 100, 200, 400, 1000]
+    animate_sizes = [10, 50, 100]
+    # Least time each case is run for, and the time after which it is stopped
+    min_time = 0.5
+    time_limit = 120
+    # A case is reported as slower when its rate drops below this fraction of
+    # the rate last recorded for it
+    tolerance = 0.8
+    chosen = argv[1:]
+    smoke = "smoke" in chosen
+    if smoke:
+        chosen = [name for name in chosen if name != "smoke"]
+        sizes = animate_sizes = [10]
+        min_time = 0
+    failed = 0
+    revision = commit()
+    previous = previous_rates()
+    print("Commit " + revision)
+    print("%-40s %12s %14s %10s" % ("Case", "Real./s", "Cells/s", "Change"))
+    for model, engine, filename, animate in engines:
+        if chosen and model not in chosen and engine not in chosen:
+            continue
+        for N in (animate_sizes if animate else sizes):
+            # Newman-Ziff covers every density in one pass
+            for p in ([None] if engine == "newman-ziff" else
+                      densities[model][1:2] if smoke else densities[model]):
+                case = (model + " " + engine + (" animated" if animate else "")
+                        + " N=" + str(N) + ("" if p is None else " p=" + str(p)))
+                queue = Queue()
+                process = Process(target=run_case, args=(filename, model, engine, animate,
+                                                         p, N, min_time, queue))
+                process.start()
+                process.join(time_limit)
+                if process.is_alive():
+                    process.terminate()
+                    print("%-40s %12s" % (case, "timeout"))
+                    if smoke:
+                        # a smoke run records nothing, and a case too slow
+                        # for the smallest grid counts as failing
+                        failed += 1
+                        continue
+                    rate = None
+                else:
+                    result = queue.get() if not queue.empty() else None
+                    if result is None:
+                        print("%-40s %12s" % (case, "skipped"))
+                        continue
+                    if result[0] == "error":
+                        print("%-40s %12s %s" % (case, "failed", result[1]))
+                        failed += 1
+                        continue
+                    if smoke:
+                        print("%-40s %12s" % (case, "ok"))
+                        continue
+                    nrep, elapsed = result
+                    rate = nrep / elapsed
+                    change = ""
+                    if case in previous:
+                        change = "%+.0f%%" % (100 * (rate / previous[case] - 1))
+                        if rate < tolerance * previous[case]:
+                            change += " slower"
+                    print("%-40s %12.1f %14.0f %10s" % (case, rate, rate * N * N, change))
+                with open(history, "a") as log:
+                    log.write(json.dumps({"commit": revision, "time": time.time(), "case": case,
+                                          "model": model, "engine": engine, "animate": animate,
+                                          "size": N, "density": p,
+                                          "realisations_per_second": rate,
+                                          "cells_per_second": None if rate is None else rate * N * N})
+                              + "\n")
+    if failed:
+        print(str(failed) + " cases failed")
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
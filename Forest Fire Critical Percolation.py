@@ -29,31 +29,32 @@ Created on Tue Mar 0 00:05:58 2020
 ## fire reaches the edge of the forest.
 import numpy as np
 import matplotlib.pyplot as plt
-import matplotlib.animation as animation
-from matplotlib import colors
-import os
-from sys import platform
-import shlex
 import pandas as pd
 from openpyxl import load_workbook
 
+# The engines are those of the percolate package.  numba is optional, without
+# it the clusters are labelled by the union-find engine.
+from percolate.forest import (njit, simulation_unionfind, simulation_compiled,
+                              simulation_packed)
+from percolate.search import critical_density
+from percolate.animation import Animation
+
 filename = "dynamic_images.html"
 # change the fps to speed up or slow down the animation
-writer = animation.HTMLWriter(fps=12)
+fps = 12
 # ensure matrix and data frame are not truncated
 np.set_printoptions(threshold=np.inf)
 #pd.set_option('display.max_columns', None)
 #pd.set_option('display.max_rows', None)
-fig = plt.figure()
-# array of images
-ims = []
+# The animation the forests are drawn into, green for trees, brown for mud
+# and orange for fire
+recorder = Animation(filename, fps)
 
 
-def simulation(p, ny, nx, nrep, animate, separate):
-    if separate == True:
-        # empties animation array after each change in density of mud in the forest.
-        global ims
-        ims = []
+def simulation(p, ny, nx, nrep, animate, separate, frames="ignition", every=1, budget=50):
+    if separate == True and recorder.recording:
+        # starts a new animation after each change in density of mud in the forest.
+        create_animation()
 
     ## The total distance across the simulation replications.
     #TD = 0
@@ -78,68 +79,148 @@ def simulation(p, ny, nx, nrep, animate, separate):
         iy, ix = ny // 2, nx // 2
         positions = []
         positions.append([iy, ix])
+        # Generation of the fire in which each position was set alight
+        level = [0]
         boolean = True
         if animate == True:
-            draw(X, j+1, p, ny, nx)
+            # The forest before the fire spreads, for replaying its spread
+            Y = X.copy()
         while True:
-            for i in positions:
+            for n, i in enumerate(positions):
                 for dx, dy in neighbourhood:
-                    try:
-                        ## Keep track of how often we reach the edges.
-                        if boolean:
-                            if ((i[0] + dy == ny - 1) or (i[1] + dx == nx - 1)) \
-                                    and X[i[0] + dy, i[1] + dx] == 0:
-                                X[i[0] + dy, i[1] + dx] = 2
-                                NB += 1
-                                boolean = False
-                                break
-                            else:
-                                if X[i[0] + dy, i[1] + dx] == 0:
-                                    X[i[0] + dy, i[1] + dx] = 2
-                                    #TD = TD + 1
-                                    positions.append([i[0] + dy, i[1] + dx])
-                                    if animate == True:
-                                        draw(X, j+1, p, ny, nx)
+                    y, x = i[0] + dy, i[1] + dx
+                    ## Cells outside the forest are skipped, rather than
+                    ## wrapping around to the far side of it.
+                    if not (0 <= y < ny and 0 <= x < nx):
                         continue
-                    except IndexError:
-                        pass
+                    ## Keep track of how often we reach any of the four edges.
+                    if boolean:
+                        if (y == 0 or y == ny - 1 or x == 0 or x == nx - 1) \
+                                and X[y, x] == 0:
+                            X[y, x] = 2
+                            NB += 1
+                            boolean = False
+                            break
+                        else:
+                            if X[y, x] == 0:
+                                X[y, x] = 2
+                                #TD = TD + 1
+                                positions.append([y, x])
+                                level.append(level[n] + 1)
             if animate == True:
+                ## Replays the spread of the fire, drawing only the frames
+                ## chosen by the frame sampling policy.
+                draw(Y, j+1, p, ny, nx)
+                chosen = sample_frames(level[1:], frames, every, budget)
+                for k, (y, x) in enumerate(positions[1:]):
+                    Y[y, x] = 2
+                    if chosen[k]:
+                        draw(Y, j+1, p, ny, nx)
                 for i in range(5):
                     draw(X, j+1, p, ny, nx)
             break
     return NB
 
 
+def sample_frames(level, frames, every, budget):
+    ## Chooses after which of the newly ignited cells, given the generation of
+    ## the fire each was set alight in, a frame is drawn.  "ignition" draws
+    ## every k-th ignition, "generation" the last ignition of each generation
+    ## and "budget" spaces about 'budget' frames evenly across the realisation.
+    n = len(level)
+    if frames == "generation":
+        return [k == n - 1 or level[k + 1] != level[k] for k in range(n)]
+    if frames == "budget":
+        every = max(1, -(-n // budget))
+    return [(k + 1) % every == 0 for k in range(n)]
+
+
+def crossings(engine, p, ny, nx, n):
+    ## The number of n replications in which the edge is reached, using the
+    ## chosen engine.
+    if engine in ("unionfind", "compiled"):
+        return cluster_engine(engine)(p, ny, nx, n)[0]
+    if engine == "packed":
+        return simulation_packed(p, ny, nx, n)
+    return simulation(p, ny, nx, n, False, False)
+
+
+def cluster_engine(engine):
+    ## The function running the chosen cluster engine, the union-find one
+    ## standing in for the compiled one when numba is not installed.
+    if engine == "compiled" and njit is not None:
+        return simulation_compiled
+    return simulation_unionfind
+
+
 def main():
     # Would you like to animate the simulations, please note this could take a while
     animate = False
     # Determines whether to create new animation at each level of density or to
     # append the new frames to the existing animation.
     separate = True
+    # How often frames are drawn while the fire spreads: "ignition" draws every
+    # k-th newly ignited cell, "generation" one frame per generation of the
+    # fire and "budget" a fixed number of frames spaced across each realisation
+    frames = "budget"
+    every = 1
+    budget = 50
+    # Which engine spreads the fire when not animating: "bfs" burns the forest
+    # cell by cell, "unionfind" labels the tree clusters and gives their sizes
+    # and "compiled" burns the forest with numba, falling back to "unionfind",
+    # which gives the same results, when numba is not installed.  "packed"
+    # spreads the fire through a forest of one bit per cell, 64 cells to a
+    # word, and does not give the sizes.
+    engine = "compiled"
+    # Search for the density at which the edge is reached with frequency
+    # 'level' instead of sweeping the densities, using max(nrep) replications
+    search = False
+    level = 0.5
     # Forest size (number of cells in x and y directions).
     sizes = [10,50,100,200,400]
     ## The number of simulation replications.
     nrep = [100,500,1000,2000,4000]
     # By how much is p decremented for each realisation
     step = 0.05
-    pc = pd.DataFrame(columns=["Size", "Crit_Perc"])
+    pc = pd.DataFrame(columns=["Size", "Crit_Perc", "Half_Width"])
     for n in sizes:
         ny, nx  = n, n
         excel_file = "forest" + str(n) + ".xlsx"
         print("\nThe grid size is: " + str(ny) + "x" + str(nx))
+        if search == True:
+            critperc, half = critical_density(
+                lambda q, m: crossings(engine, q, ny, nx, m), level, max(nrep))
+            print("The critical density is: " + str(round(critperc, 4)) + " +/- "
+                  + str(round(half, 4)))
+            pc.loc[sizes.index(n)] = [n, critperc, half]
+            print(pc)
+            continue
         for i in nrep:
             pc_boolean = True
             i = round(i)
             print("\nRunning simulation with " + str(i) + " realisations")
             # The density of mud in the forest not occupied by trees
             p = 1
-            df = pd.DataFrame(columns=["Density", "Number_Edge", "Frequency_Reach_Edge"])
+            df = pd.DataFrame(columns=["Density", "Number_Edge", "Frequency_Reach_Edge", "Average_Size"])
             j = 0
             while p > 0:
                 p -= step
                 p = round(p, 2)
-                sim = simulation(p, ny, nx, i, animate, separate)
-                NB = sim
+                if animate == False and engine == "unionfind":
+                    sim = cluster_engine(engine)(p, ny, nx, i)
+                    NB = sim[0]
+                    TS = sim[1]
+                elif animate == False and engine == "compiled":
+                    sim = cluster_engine(engine)(p, ny, nx, i)
+                    NB = sim[0]
+                    TS = sim[1]
+                elif animate == False and engine == "packed":
+                    NB = simulation_packed(p, ny, nx, i)
+                    TS = np.nan
+                else:
+                    sim = simulation(p, ny, nx, i, animate, separate, frames, every, budget)
+                    NB = sim
+                    TS = np.nan
                 #TD = sim[1]
                 ## The estimated probability that we reach the edge.
                 ## Frequency with which the edge is reached at each probability
@@ -148,11 +229,14 @@ def main():
                 ## The average distance that is reached.
                 #TDavg = TD / i
 
-                df.loc[j] = [p, NB, NBprob]
+                ## The average number of trees burnt.
+                TSavg = TS / i
+
+                df.loc[j] = [p, NB, NBprob, TSavg]
                 j += 1
                 ## Draws the final frame of each simulation multiple times
                 ## to allow enough time for the user to pause the animation
-                if animate == True:
+                if animate == True and separate == True:
                     create_animation()
 
                 if pc_boolean and NB >= 1:
@@ -185,8 +269,11 @@ def main():
             plt.xticks(np.arange(0, 1+step, step=0.1))
             plt.yticks(np.arange(0, 1.1, step=0.1))
             plt.show()
-        pc.loc[sizes.index(n)] = [n, critperc]
+        pc.loc[sizes.index(n)] = [n, critperc, np.nan]
         print(pc)
+    ## Every frame of the sweep went into one animation, which is now complete.
+    if animate == True and separate == False:
+        create_animation()
     pc.plot(x='Size', y='Crit_Perc', kind='scatter')
     plt.title("Critical Percolation against Matrix Size \nNumber of Realisations " + str(i))
     plt.xlim(0, 1)
@@ -214,42 +301,12 @@ def main():
 
 
 def draw(data, j, p, ny, nx):
-    # Colours for visualization: green for trees, brown for mud and orange for fire.
-    # module is poorly coded so colours and boundary array each need one more
-    # element than there are colours in the animation and numbers in the matrix.
-    colors_list = ['green', 'brown', 'black', 'orange']
-    # observe that the colour black appears nowhere in the animation and neither
-    # does the number three appear anywhere within the matrix,
-    # i do not know why the developer indexes the arrays incorrectly.
-    # create discrete colormap
-    cmap = colors.ListedColormap(colors_list)
-    bounds = [0, 1, 2, 3]
-    norm = colors.BoundaryNorm(bounds, cmap.N)
-    global ims
-    plt.xticks([])
-    plt.yticks([])
-    plt.title("Density of mud in the forest: " + str(p) + "\n Number of realisations: "
-              + str(j) + "\nSize of matrix: " + str(ny) + "x" + str(nx))
-    im = plt.imshow(data, cmap=cmap, norm=norm, animated=True)
-    ims.append([im])
+    recorder.draw(data, "Density of mud in the forest: " + str(p) + "\n Number of realisations: "
+                  + str(j) + "\nSize of matrix: " + str(ny) + "x" + str(nx))
 
 
 def create_animation():
-    print("\nCreating animation, please wait...")
-    ani = animation.ArtistAnimation(fig, ims, blit=True)
-    ani.save(filename, writer=writer)
-    # OS X
-    if platform == "darwin":
-        try:
-            os.system("open " + shlex.quote(filename))
-        except:
-            print("You will need to manually open the html file")
-    # Windows
-    elif platform == "win32":
-        try:
-            os.system("start " + filename)
-        except:
-            print("You will need to manually open the html file")
+    recorder.finish()
 
 
 if __name__ == '__main__':
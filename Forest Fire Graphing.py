@@ -29,31 +29,30 @@ Created on Tue Mar 0 00:05:58 2020
 ## fire reaches the edge of the forest.
 import numpy as np
 import matplotlib.pyplot as plt
-import matplotlib.animation as animation
-from matplotlib import colors
-import os
-from sys import platform
-import shlex
+import time
 import pandas as pd
 from openpyxl import load_workbook
 
+from percolate.forest import simulation_newman_ziff, crossing_number
+from percolate.animation import Animation
+from percolate.timing import timings, clear, record, report
+
 filename = "dynamic_images.html"
 # change the fps to speed up or slow down the animation
-writer = animation.HTMLWriter(fps=12)
+fps = 12
 # ensure matrix and data frame are not truncated
 np.set_printoptions(threshold=np.inf)
 pd.set_option('display.max_columns', None)
 pd.set_option('display.max_rows', None)
-fig = plt.figure()
-# array of images
-ims = []
+# The animation the forests are drawn into, green for trees, brown for mud
+# and orange for fire
+recorder = Animation(filename, fps)
 
 
 def simulation(p, ny, nx, nrep, animate, separate):
-    if separate == True:
-        # empties animation array after each change in density of mud in the forest.
-        global ims
-        ims = []
+    if separate == True and recorder.recording:
+        # starts a new animation after each change in density of mud in the forest.
+        create_animation()
 
     ## The total distance across the simulation replications.
     #TD = 0
@@ -66,12 +65,19 @@ def simulation(p, ny, nx, nrep, animate, separate):
     """
     #neighbourhood = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
     """
+    ## Seconds spent planting the forest and spreading the fire.
+    grid = spread = 0.0
+
     ## Simulation replications.
     for j in range(int(nrep)):
+        start = time.perf_counter()
         # Initialize the forest grid.
         X = np.random.choice([0, 1], size=ny * nx, p=[1-p, p]).reshape(ny, nx)
         # Starting position of fire at centre of grid
         X[(ny//2), (nx//2)] = 2
+        generated = time.perf_counter()
+        # frames drawn while the fire spreads are timed by draw itself
+        drawn = timings.get("draw", 0)
 
         """Iterate the forest according to the forest-fire rules."""
 
@@ -84,29 +90,35 @@ def simulation(p, ny, nx, nrep, animate, separate):
         while True:
             for i in positions:
                 for dx, dy in neighbourhood:
-                    try:
-                        ## Keep track of how often we reach the edges.
-                        if boolean:
-                            if ((i[0] + dy == ny - 1) or (i[1] + dx == nx - 1)) \
-                                    and X[i[0] + dy, i[1] + dx] == 0:
-                                X[i[0] + dy, i[1] + dx] = 2
-                                NB += 1
-                                boolean = False
-                                break
-                            else:
-                                if X[i[0] + dy, i[1] + dx] == 0:
-                                    X[i[0] + dy, i[1] + dx] = 2
-                                    #TD = TD + 1
-                                    positions.append([i[0] + dy, i[1] + dx])
-                                    if animate == True:
-                                        draw(X, j+1, p, ny, nx)
+                    y, x = i[0] + dy, i[1] + dx
+                    ## Cells outside the forest are skipped, rather than
+                    ## wrapping around to the far side of it.
+                    if not (0 <= y < ny and 0 <= x < nx):
                         continue
-                    except IndexError:
-                        pass
+                    ## Keep track of how often we reach any of the four
+                    ## edges, as the Newman-Ziff engine does.
+                    if boolean:
+                        if (y == 0 or y == ny - 1 or x == 0 or x == nx - 1) \
+                                and X[y, x] == 0:
+                            X[y, x] = 2
+                            NB += 1
+                            boolean = False
+                            break
+                        else:
+                            if X[y, x] == 0:
+                                X[y, x] = 2
+                                #TD = TD + 1
+                                positions.append([y, x])
+                                if animate == True:
+                                    draw(X, j+1, p, ny, nx)
             if animate == True:
                 for i in range(5):
                     draw(X, j+1, p, ny, nx)
             break
+        grid += generated - start
+        spread += time.perf_counter() - generated - (timings.get("draw", 0) - drawn)
+    record("grid", grid, int(nrep))
+    record("spread", spread, int(nrep))
     return NB
 
 
@@ -127,6 +139,8 @@ def main():
         excel_file = "forest" + str(n) + ".xlsx"
         print("\nThe grid size is: " + str(ny) + "x" + str(nx))
         for i in nrep:
+            clear()
+            block = time.perf_counter()
             pc_boolean = True
             i = round(i)
             print("\nRunning simulation with " + str(i) + " realisations")
@@ -134,11 +148,27 @@ def main():
             p = 1
             df = pd.DataFrame(columns=["Density", "Number_Edge", "Frequency_Reach_Edge"])
             j = 0
+            ## Without animation a single Newman-Ziff pass per replication
+            ## gives the edge-reach at every density in the sweep.  Number_Edge
+            ## is then the expected number of the replications reaching the
+            ## edge at that density, averaged over the binomial number of
+            ## trees, so it need not be a whole number, and the critical
+            ## density is the first at which it is at least one.  With
+            ## animation it is the count of the replications run.
+            if animate == False:
+                start = time.perf_counter()
+                first = simulation_newman_ziff(ny, nx, i)
+                record("newman-ziff", time.perf_counter() - start, i)
             while p > 0:
                 p -= step
                 p = round(p, 2)
-                sim = simulation(p, ny, nx, i, animate, separate)
-                NB = sim
+                if animate == False:
+                    start = time.perf_counter()
+                    NB = crossing_number(first, p, ny, nx)
+                    record("crossing", time.perf_counter() - start)
+                else:
+                    sim = simulation(p, ny, nx, i, animate, separate)
+                    NB = sim
                 #TD = sim[1]
                 ## The estimated probability that we reach the edge.
                 ## Frequency with which the edge is reached at each probability
@@ -147,16 +177,19 @@ def main():
                 ## The average distance that is reached.
                 #TDavg = TD / i
 
+                start = time.perf_counter()
                 df.loc[j] = [p, NB, NBprob]
+                record("append", time.perf_counter() - start)
                 j += 1
                 ## Draws the final frame of each simulation multiple times
                 ## to allow enough time for the user to pause the animation
-                if animate == True:
+                if animate == True and separate == True:
                     create_animation()
 
                 if pc_boolean and NB >= 1:
                     critperc = p
                     pc_boolean = False
+            start = time.perf_counter()
             if nrep.index(i) == 0:
                 with pd.ExcelWriter(excel_file) as writer:
                     writer.save()
@@ -173,9 +206,11 @@ def main():
                     writer.save()
             except PermissionError:
                 print("Please ensure the file '" + str(excel_file) + "' is not open in another program")
+            record("excel", time.perf_counter() - start)
 
             print(df)
             print(critperc)
+            start = time.perf_counter()
             df.plot(x='Density', y='Frequency_Reach_Edge', kind='scatter')
             plt.title("Forest Fire Percolation - " + str(i) + " Realisations - " + str(n) + "x" + str(n) + " Grid")
             plt.xlim(0, 1)
@@ -185,45 +220,24 @@ def main():
             plt.xticks(np.arange(0, 1+step, step=0.1))
             plt.yticks(np.arange(0, 1.1, step=0.1))
             plt.show()
+            record("plot", time.perf_counter() - start)
+            report("forest", n, i, time.perf_counter() - block)
+    ## Every frame of the sweep went into one animation, which is now complete.
+    if animate == True and separate == False:
+        create_animation()
 
 
 def draw(data, j, p, ny, nx):
-    # Colours for visualization: green for trees, brown for mud and orange for fire.
-    # module is poorly coded so colours and boundary array each need one more
-    # element than there are colours in the animation and numbers in the matrix.
-    colors_list = ['green', 'brown', 'black', 'orange']
-    # observe that the colour black appears nowhere in the animation and neither
-    # does the number three appear anywhere within the matrix,
-    # i do not know why the developer indexes the arrays incorrectly.
-    # create discrete colormap
-    cmap = colors.ListedColormap(colors_list)
-    bounds = [0, 1, 2, 3]
-    norm = colors.BoundaryNorm(bounds, cmap.N)
-    global ims
-    plt.xticks([])
-    plt.yticks([])
-    plt.title("Density of mud in the forest: " + str(p) + "\n Number of realisations: "
-              + str(j) + "\nSize of matrix: " + str(ny) + "x" + str(nx))
-    im = plt.imshow(data, cmap=cmap, norm=norm, animated=True)
-    ims.append([im])
+    start = time.perf_counter()
+    recorder.draw(data, "Density of mud in the forest: " + str(p) + "\n Number of realisations: "
+                  + str(j) + "\nSize of matrix: " + str(ny) + "x" + str(nx))
+    record("draw", time.perf_counter() - start)
 
 
 def create_animation():
-    print("\nCreating animation, please wait...")
-    ani = animation.ArtistAnimation(fig, ims, blit=True)
-    ani.save(filename, writer=writer)
-    # OS X
-    if platform == "darwin":
-        try:
-            os.system("open " + shlex.quote(filename))
-        except:
-            print("You will need to manually open the html file")
-    # Windows
-    elif platform == "win32":
-        try:
-            os.system("start " + filename)
-        except:
-            print("You will need to manually open the html file")
+    start = time.perf_counter()
+    recorder.finish()
+    record("animation", time.perf_counter() - start)
 
 
 if __name__ == '__main__':
@@ -29,35 +29,46 @@ Created on Tue Mar 0 00:05:58 2020
 ## fire reaches the edge of the forest.
 
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
-from matplotlib import colors
-import os
-from sys import platform
-import shlex
-import pandas as pd
-from openpyxl import load_workbook
-import seaborn as sns
+from sys import argv
+
+from percolate import forest
+from percolate.animation import Animation
+from percolate.sweep import cells, run
+from percolate.report import save_results, export_xlsx
 
 filename = "dynamic_images.html"
 
 # change the fps to speed up or slow down the animation
-writer = animation.HTMLWriter(fps=12)
+fps = 12
 
-# ensure matrix and data frame are not truncated
+# ensure matrix is not truncated
 np.set_printoptions(threshold=np.inf)
-pd.set_option('display.max_columns', None)
-pd.set_option('display.max_rows', None)
-fig = plt.figure()
 
-# array of images
-ims = []
+# matplotlib, seaborn, pandas and openpyxl take over a second to import and
+# matplotlib wants a display, so they are imported by tables() and plotting()
+# when first needed.  A headless run, and the worker processes of the sweep,
+# only ever import numpy.
+plt = sns = None
+pd = load_workbook = None
+# The animation the forests are drawn into, green for trees, brown for mud
+# and orange for fire
+recorder = Animation(filename, fps)
+
+def simulation(p, ny, nx, nrep, animate, separate, rng=None):
+    ## Without animation the fire need not be spread cell by cell, so the
+    ## fastest engine of the percolate package is used.  Every engine counts
+    ## the edge as reached when the fire reaches any of the four edges, as the
+    ## spread below does, so the results do not depend on the engine.
+    if animate == False:
+        return forest.simulation(p, ny, nx, nrep, rng)[0]
+
+    # The random stream to draw from, numpy's global one unless a
+    # numpy.random.Generator is given.
+    random = np.random if rng is None else rng
 
-def simulation(p, ny, nx, nrep, animate, separate):
-    if separate == True:
-        # empties animation array after change in density of mud in the forest.
-        global ims
-        ims = []
+    if separate == True and recorder.recording:
+        # starts a new animation after each change in density of mud in the forest.
+        create_animation()
 
     ## The total distance across the simulation replications.
     #TD = 0
@@ -70,7 +81,7 @@ def simulation(p, ny, nx, nrep, animate, separate):
     ## Simulation replications.
     for j in range(int(nrep)):
         # Initialize the forest grid.
-        X = np.random.choice([0, 1], size=ny * nx, p=[1-p, p]).reshape(ny, nx)
+        X = random.choice([0, 1], size=ny * nx, p=[1-p, p]).reshape(ny, nx)
         # Starting position of fire at centre of grid
         X[(ny//2), (nx//2)] = 2
 
@@ -85,26 +96,26 @@ def simulation(p, ny, nx, nrep, animate, separate):
         while True:
             for i in positions:
                 for dx, dy in neighbourhood:
-                    try:
-                        ## Keep track of how often we reach the edges.
-                        if boolean:
-                            if ((i[0] + dy == ny - 1) or (i[1] + dx == nx - 1)) \
-                                    and X[i[0] + dy, i[1] + dx] == 0:
-                                X[i[0] + dy, i[1] + dx] = 2
-                                NB += 1
-                                boolean = False
-                                break
-                            else:
-                                if X[i[0] + dy, i[1] + dx] == 0:
-                                    X[i[0] + dy, i[1] + dx] = 2
-                                    #TD = TD + 1
-                                    positions.append([i[0] + dy, i[1] + dx])
-                                    if animate == True:
-                                        draw(X, j+1, p, ny, nx)
+                    y, x = i[0] + dy, i[1] + dx
+                    ## Cells outside the forest are skipped, rather than
+                    ## wrapping around to the far side of it.
+                    if not (0 <= y < ny and 0 <= x < nx):
                         continue
-
-                    except IndexError:
-                        pass
+                    ## Keep track of how often we reach any of the four edges.
+                    if boolean:
+                        if (y == 0 or y == ny - 1 or x == 0 or x == nx - 1) \
+                                and X[y, x] == 0:
+                            X[y, x] = 2
+                            NB += 1
+                            boolean = False
+                            break
+                        else:
+                            if X[y, x] == 0:
+                                X[y, x] = 2
+                                #TD = TD + 1
+                                positions.append([y, x])
+                                if animate == True:
+                                    draw(X, j+1, p, ny, nx)
             if animate == True:
                 for i in range(5):
                     draw(X, j+1, p, ny, nx)
@@ -112,24 +123,54 @@ def simulation(p, ny, nx, nrep, animate, separate):
     return NB
 
 
-def main():
+def sweep(sizes, nrep, step, workers=None, seed=None,
+          journal="forest_journal.jsonl"):
+    """Run every (size, realisations, density) cell of the sweep in main()
+    on the fastest engine of the percolate package, across a pool of worker
+    processes, journalled so that an interrupted sweep resumes where it
+    stopped.  Returns a dictionary of the number of times that the edge is
+    reached and the number of cells burnt, keyed by ("forest", size,
+    realisations, density)."""
+    wanted = cells({"model": "forest", "sizes": [round(n) for n in sizes],
+                    "realisations": nrep, "start": 1 - step, "stop": 0, "step": step})
+    return run(wanted, workers=workers, seed=seed, journal=journal)
+
+
+def main(headless=False):
     # Would you like to animate the simulations, please note this may take a while
     animate = False
     # Determines whether to create new animation at each level of density or to
     # append the new frames to the existing animation.
     separate = True
+    # Number of processes running the simulations, None uses every core
+    workers = None
+    # Seed for the random streams, set to an integer to reproduce a sweep
+    seed = None
+    # Journal of finished cells, an interrupted sweep picks up from it when
+    # run again, delete it to start a new sweep
+    journal = "forest_journal.jsonl"
     # Forest size (number of cells in x and y directions).
     sizes = [10, 50, 100, 200, 400]
     ## The number of simulation replications.
     nrep = [100, 500, 1000, 2000, 4000]
     # By how much is p decremented for each realisation
     step = 0.01
+    if headless:
+        # Only the numbers: every cell is run into the journal, from which a
+        # later run without animation makes the tables and plots at once.
+        results = sweep(sizes, nrep, step, workers, seed, journal)
+        print("Finished " + str(len(results)) + " cells, recorded in " + journal)
+        return
+    tables()
+    plotting()
     pc = pd.DataFrame(columns=["Grid Size", "Realisations", "Crit_Perc"])
     k = 0
+    ## Without animation every cell of the sweep is run up front in parallel.
+    if animate == False:
+        results = sweep(sizes, nrep, step, workers, seed, journal)
     for n in sizes:
         n = round(n)
         ny, nx  = n, n
-        excel_file = "forest" + str(n) + ".xlsx"
         print("\nThe grid size is: " + str(ny) + "x" + str(nx))
         for i in nrep:
             pc_boolean = True
@@ -143,7 +184,10 @@ def main():
             while p > 0:
                 p -= step
                 p = round(p, 2)
-                sim = simulation(p, ny, nx, i, animate, separate)
+                if animate == False:
+                    sim = results[("forest", n, i, p)][0]
+                else:
+                    sim = simulation(p, ny, nx, i, animate, separate)
 
                 NB = sim
                 #TD = sim[1]
@@ -160,30 +204,13 @@ def main():
 
                 ## Draws the final frame of each simulation multiple times
                 ## to allow enough time for the user to pause the animation
-                if animate == True:
+                if animate == True and separate == True:
                     create_animation()
 
                 if pc_boolean and NB >= 1:
                     critperc = p
                     pc_boolean = False
-            if nrep.index(i) == 0:
-                with pd.ExcelWriter(excel_file) as writer:
-                    writer.save()
-                    print("Created the excel file " + str(excel_file))
-            try:
-                with pd.ExcelWriter(excel_file, engine='openpyxl', mode='a') \
-                        as writer:
-                    writer.book = load_workbook(excel_file)
-                    sheetName = str(i) + 'realisations' + str(n) + "by" + str(n)
-                    df.to_excel(writer, sheetName, index=False, header=True)
-                    try:
-                        writer.book.remove(writer.book['Sheet1'])
-                    except KeyError:
-                        pass
-                    writer.save()
-            except PermissionError:
-                print("Please ensure the file '" + str(excel_file) +
-                      "' is not open in another program")
+            save_results(df, "forest", n, i)
 
             print(df)
             df.plot(x='Density', y='Frequency_Reach_Edge', kind='scatter')
@@ -198,6 +225,9 @@ def main():
             plt.show()
             pc.loc[k] = [n, i, critperc]
             k += 1
+    ## Every frame of the sweep went into one animation, which is now complete.
+    if animate == True and separate == False:
+        create_animation()
     # method removes trailing zeros from data frame
     size = pd.Series(pc['Grid Size'])
     mask = pd.to_numeric(size).notnull()
@@ -238,45 +268,41 @@ def main():
               "is not open in another program")
 
 
+def tables():
+    ## Imports pandas and openpyxl the first time a data frame is needed.
+    global pd, load_workbook
+    if pd is None:
+        import pandas as pd
+        from openpyxl import load_workbook
+        # ensure data frame is not truncated
+        pd.set_option('display.max_columns', None)
+        pd.set_option('display.max_rows', None)
+
+
+def plotting():
+    ## Imports matplotlib and seaborn the first time anything is drawn.
+    global plt, sns
+    if plt is None:
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+
+
 def draw(data, j, p, ny, nx):
-    # Colours for visualization: green for trees, brown for mud and orange for fire.
-    # module is poorly coded so colours and boundary array each need one more
-    # element than there are colours in the animation and numbers in the matrix.
-    colors_list = ['green', 'brown', 'black', 'orange']
-    # observe that the colour black appears nowhere in the animation and neither
-    # does the number three appear anywhere within the matrix,
-    # i do not know why the developer indexes the arrays incorrectly.
-    # create discrete colormap
-    cmap = colors.ListedColormap(colors_list)
-    bounds = [0, 1, 2, 3]
-    norm = colors.BoundaryNorm(bounds, cmap.N)
-    global ims
-    plt.xticks([])
-    plt.yticks([])
-    plt.title("Density of mud in the forest: " + str(p)
-              + "\n Number of realisations: " + str(j)
-              + "\nSize of matrix: " + str(ny) + "x" + str(nx))
-    im = plt.imshow(data, cmap=cmap, norm=norm, animated=True)
-    ims.append([im])
+    recorder.draw(data, "Density of mud in the forest: " + str(p) + "\n Number of realisations: "
+                  + str(j) + "\nSize of matrix: " + str(ny) + "x" + str(nx))
 
 
 def create_animation():
-    print("\nCreating animation, please wait...")
-    ani = animation.ArtistAnimation(fig, ims, blit=True)
-    ani.save(filename, writer=writer)
-    # OS X
-    if platform == "darwin":
-        try:
-            os.system("open " + shlex.quote(filename))
-        except:
-            print("You will need to manually open the html file")
-    # Windows
-    elif platform == "win32":
-        try:
-            os.system("start " + filename)
-        except:
-            print("You will need to manually open the html file")
+    recorder.finish()
 
 
 if __name__ == '__main__':
-    main()
+    # 'export-xlsx' writes the stored results out as Excel workbooks instead,
+    # in results/workbooks, and 'export-xlsx force' overwrites those there
+    if argv[1:2] == ["export-xlsx"]:
+        export_xlsx("forest", force=argv[2:] == ["force"])
+    # 'headless' only runs the sweep into the journal, with no tables or plots
+    elif argv[1:] == ["headless"]:
+        main(headless=True)
+    else:
+        main()
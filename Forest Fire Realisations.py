@@ -29,31 +29,27 @@ Created on Tue Mar 0 00:05:58 2020
 ## fire reaches the edge of the forest.
 import numpy as np
 import matplotlib.pyplot as plt
-import matplotlib.animation as animation
-from matplotlib import colors
-import os
-from sys import platform
-import shlex
 import pandas as pd
 from openpyxl import load_workbook
 
+from percolate.animation import Animation
+
 filename = "dynamic_images.html"
 # change the fps to speed up or slow down the animation
-writer = animation.HTMLWriter(fps=12)
+fps = 12
 # ensure matrix and data frame are not truncated
 np.set_printoptions(threshold=np.inf)
 #pd.set_option('display.max_columns', None)
 #pd.set_option('display.max_rows', None)
-fig = plt.figure()
-# array of images
-ims = []
+# The animation the forests are drawn into, green for trees, brown for mud
+# and orange for fire
+recorder = Animation(filename, fps)
 
 
 def simulation(p, ny, nx, nrep, animate, separate):
-    if separate == True:
-        # empties animation array after each change in density of mud in the forest.
-        global ims
-        ims = []
+    if separate == True and recorder.recording:
+        # starts a new animation after each change in density of mud in the forest.
+        create_animation()
 
     ## The total distance across the simulation replications.
     #TD = 0
@@ -84,25 +80,26 @@ def simulation(p, ny, nx, nrep, animate, separate):
         while True:
             for i in positions:
                 for dx, dy in neighbourhood:
-                    try:
-                        ## Keep track of how often we reach the edges.
-                        if boolean:
-                            if ((i[0] + dy == ny - 1) or (i[1] + dx == nx - 1)) \
-                                    and X[i[0] + dy, i[1] + dx] == 0:
-                                X[i[0] + dy, i[1] + dx] = 2
-                                NB += 1
-                                boolean = False
-                                break
-                            else:
-                                if X[i[0] + dy, i[1] + dx] == 0:
-                                    X[i[0] + dy, i[1] + dx] = 2
-                                    #TD = TD + 1
-                                    positions.append([i[0] + dy, i[1] + dx])
-                                    if animate == True:
-                                        draw(X, j+1, p, ny, nx)
+                    y, x = i[0] + dy, i[1] + dx
+                    ## Cells outside the forest are skipped, rather than
+                    ## wrapping around to the far side of it.
+                    if not (0 <= y < ny and 0 <= x < nx):
                         continue
-                    except IndexError:
-                        pass
+                    ## Keep track of how often we reach any of the four edges.
+                    if boolean:
+                        if (y == 0 or y == ny - 1 or x == 0 or x == nx - 1) \
+                                and X[y, x] == 0:
+                            X[y, x] = 2
+                            NB += 1
+                            boolean = False
+                            break
+                        else:
+                            if X[y, x] == 0:
+                                X[y, x] = 2
+                                #TD = TD + 1
+                                positions.append([y, x])
+                                if animate == True:
+                                    draw(X, j+1, p, ny, nx)
             if animate == True:
                 for i in range(5):
                     draw(X, j+1, p, ny, nx)
@@ -152,7 +149,7 @@ def main():
                 j += 1
                 ## Draws the final frame of each simulation multiple times
                 ## to allow enough time for the user to pause the animation
-                if animate == True:
+                if animate == True and separate == True:
                     create_animation()
 
                 if pc_boolean and NB >= 1:
@@ -196,6 +193,9 @@ def main():
         plt.xticks(np.arange(0, 1+0.1, step=0.1))
         plt.yticks(np.arange(0, i+0.1, step=max(nrep)/10))
         plt.show()
+    ## Every frame of the sweep went into one animation, which is now complete.
+    if animate == True and separate == False:
+        create_animation()
     with pd.ExcelWriter("forestpcnrep.xlsx") as writer:
         writer.save()
         print("Created the excel file 'forestpcnrep.xlsx'")
@@ -214,42 +214,12 @@ def main():
 
 
 def draw(data, j, p, ny, nx):
-    # Colours for visualization: green for trees, brown for mud and orange for fire.
-    # module is poorly coded so colours and boundary array each need one more
-    # element than there are colours in the animation and numbers in the matrix.
-    colors_list = ['green', 'brown', 'black', 'orange']
-    # observe that the colour black appears nowhere in the animation and neither
-    # does the number three appear anywhere within the matrix,
-    # i do not know why the developer indexes the arrays incorrectly.
-    # create discrete colormap
-    cmap = colors.ListedColormap(colors_list)
-    bounds = [0, 1, 2, 3]
-    norm = colors.BoundaryNorm(bounds, cmap.N)
-    global ims
-    plt.xticks([])
-    plt.yticks([])
-    plt.title("Density of mud in the forest: " + str(p) + "\n Number of realisations: "
-              + str(j) + "\nSize of matrix: " + str(ny) + "x" + str(nx))
-    im = plt.imshow(data, cmap=cmap, norm=norm, animated=True)
-    ims.append([im])
+    recorder.draw(data, "Density of mud in the forest: " + str(p) + "\n Number of realisations: "
+                  + str(j) + "\nSize of matrix: " + str(ny) + "x" + str(nx))
 
 
 def create_animation():
-    print("\nCreating animation, please wait...")
-    ani = animation.ArtistAnimation(fig, ims, blit=True)
-    ani.save(filename, writer=writer)
-    # OS X
-    if platform == "darwin":
-        try:
-            os.system("open " + shlex.quote(filename))
-        except:
-            print("You will need to manually open the html file")
-    # Windows
-    elif platform == "win32":
-        try:
-            os.system("start " + filename)
-        except:
-            print("You will need to manually open the html file")
+    recorder.finish()
 
 
 if __name__ == '__main__':
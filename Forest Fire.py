@@ -28,24 +28,19 @@ Created on Tue Mar 0 00:05:58 2020
 ## spreads before getting stuck, and the proportion of the time that the
 ## fire reaches the edge of the forest.
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
-from matplotlib import colors
-import os
-from sys import platform
-import shlex
 from numpy.random import choice
 
+from percolate.animation import Animation
+
 filename = "dynamic_images.html"
 # change the fps to speed up or slow down the animation
-writer = animation.HTMLWriter(fps=12)
+fps = 12
 # ensure matrix is not truncated
 np.set_printoptions(threshold=np.inf)
 
-fig = plt.figure()
-
-# array of images
-ims = []
+# The animation the forests are drawn into, green for trees, brown for mud
+# and orange for fire
+recorder = Animation(filename, fps)
 
 def simulation(nrep):
     # The density of mud in the forest not occupied by trees
@@ -78,66 +73,37 @@ def simulation(nrep):
         while True:
             for i in positions:
                 for dx, dy in neighbourhood:
-                    try:
-                        ## Keep track of how often we reach the edges.
-                        if boolean:
-                            if ((i[0] + dy == ny - 1) or (i[1] + dx == nx - 1)) and X[i[0] + dy, i[1] + dx] == 0:
-                                X[i[0] + dy, i[1] + dx] = 2
-                                for i in range (5):
-                                    draw(X)
-                                print("Fire reached the edge of the forest")
-                                create_animation()
-                                boolean = False
-                                break
-                            else:
-                                if X[i[0] + dy, i[1] + dx] == 0:
-                                    X[i[0] + dy, i[1] + dx] = 2
-                                    positions.append([i[0] + dy, i[1] + dx])
-                                    draw(X)
+                    y, x = i[0] + dy, i[1] + dx
+                    ## Cells outside the forest are skipped, rather than
+                    ## wrapping around to the far side of it.
+                    if not (0 <= y < ny and 0 <= x < nx):
                         continue
-                    except IndexError:
-                        pass
+                    ## Keep track of how often we reach any of the four edges.
+                    if boolean:
+                        if (y == 0 or y == ny - 1 or x == 0 or x == nx - 1) and X[y, x] == 0:
+                            X[y, x] = 2
+                            for i in range (5):
+                                draw(X)
+                            print("Fire reached the edge of the forest")
+                            create_animation()
+                            boolean = False
+                            break
+                        else:
+                            if X[y, x] == 0:
+                                X[y, x] = 2
+                                positions.append([y, x])
+                                draw(X)
             if boolean != False:
                 print("Fire stopped spreading")
                 create_animation()
             break
 
 def draw(data):
-    # Colours for visualization: green for trees, brown for mud and orange for fire.
-    # module is poorly coded so colours and boundary array each need one more
-    # element than there are colours in the animation and numbers in the matrix.
-    colors_list = ['green', 'brown', 'black', 'orange']
-    # observe that the colour black appears nowhere in the animation and neither
-    # does the number three appear anywhere within the matrix,
-    # i do not know why the developer indexes the arrays incorrectly.
-    # create discrete colormap
-    cmap = colors.ListedColormap(colors_list)
-    bounds = [0, 1, 2, 3]
-    norm = colors.BoundaryNorm(bounds, cmap.N)
-    global ims
-    plt.xticks([])
-    plt.yticks([])
-    im = plt.imshow(data, cmap=cmap, norm=norm, animated=True)
-    ims.append([im])
+    recorder.draw(data)
 
 
 def create_animation():
-    print(ims)
-    print("\nCreating animation, please wait...")
-    ani = animation.ArtistAnimation(fig, ims, blit=True)
-    ani.save(filename, writer=writer)
-    # OS X
-    if platform == "darwin":
-        try:
-            os.system("open " + shlex.quote(filename))
-        except:
-            print("You will need to manually open the html file")
-    # Windows
-    elif platform == "win32":
-        try:
-            os.system("start " + filename)
-        except:
-            print("You will need to manually open the html file")
+    recorder.finish()
 
 
 def main():
@@ -27,106 +27,262 @@ Created on Tue Mar 0 00:05:58 2020
 ## Use simulation to calculate the average distance over which the fire
 ## spreads before getting stuck, and the proportion of the time that the
 ## fire reaches the edge of the forest.
+##
+## The Drossel-Schwabl forest fire instead runs for many generations, with
+## mud growing trees and lightning starting new fires, and streams the
+## distribution of the sizes of its fires to disk.
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
-from matplotlib import colors
 import os
-from sys import platform
-import shlex
-from numpy.random import choice
 import pandas as pd
 
+from percolate.animation import Animation
+
 filename = "dynamic_images.html"
 # change the fps to speed up or slow down the animation
-writer = animation.HTMLWriter(fps=4)
+fps = 4
 # ensure matrix is not truncated
 np.set_printoptions(threshold=np.inf)
 
-fig = plt.figure()
-
-# array of images
-ims = []
+# The animation the forests are drawn into, green for trees, brown for mud
+# and orange for fire
+recorder = Animation(filename, fps)
 
-def simulation(nrep):
+def simulation(nrep, animate=True, rng=None):
+    ## Burns nrep forests, returning the data frame of the generations of
+    ## each in turn.
+    if rng is None:
+        rng = np.random.default_rng()
     # The density of mud in the forest not occupied by trees
     p = 0.6
     # Probability of a tree catching fire.
     f = 0.7
     # Forest size (number of cells in x and y directions).
     ny, nx = 5, 5
+    stats = []
     for i in range(int(nrep)):
         # Initialize the forest grid.
-        X = np.random.choice([0, 1], size=ny * nx, p=[1-p, p]).reshape(ny, nx)
+        X = (rng.random((ny, nx)) < p).astype(np.int8)
         X[(ny//2), (nx//2)] = 2
-        iterate(X, ny, nx, f)
+        stats.append(iterate(X, ny, nx, f, animate, rng))
+    return stats
+
+
+def iterate(X, ny, nx, f, animate=True, rng=None):
+    """Iterate the forest according to the forest-fire rules, a whole
+    generation at a time, until the fire goes out.  Returns a data frame of
+    the statistics of each generation."""
+    if rng is None:
+        rng = np.random.default_rng()
+    ## The cells set alight in the last generation are the front of the
+    ## fire.  In each generation every tree next to the front (of its 8
+    ## neighbours) catches fire with probability f, all at once from one
+    ## random draw, and the trees which caught fire become the new front.
+    ## The fire goes out when a generation sets no tree alight.
+    front = X == 2
+    burnt = int(np.count_nonzero(front))
+    trees = int(np.count_nonzero(X == 0))
+    rows = np.flatnonzero(front.any(axis=1))
+    cols = np.flatnonzero(front.any(axis=0))
+    edge = burnt > 0 and (rows[0] == 0 or rows[-1] == ny - 1
+                          or cols[0] == 0 or cols[-1] == nx - 1)
+    stats = [[0, burnt, burnt, trees, bool(edge)]]
+    if animate == True:
+        draw(X)
+    generation = 0
+    while len(rows) > 0:
+        generation += 1
+        ## Only the window one cell around the front can catch fire.
+        top, bottom = max(rows[0] - 1, 0), min(rows[-1] + 2, ny)
+        left, right = max(cols[0] - 1, 0), min(cols[-1] + 2, nx)
+        window = (slice(top, bottom), slice(left, right))
+        F = np.pad(front[window], 1)
+        near = (F[:-2, :-2] | F[:-2, 1:-1] | F[:-2, 2:] | F[1:-1, :-2]
+                | F[1:-1, 2:] | F[2:, :-2] | F[2:, 1:-1] | F[2:, 2:])
+        alight = near & (X[window] == 0)
+        alight[alight] = rng.random(np.count_nonzero(alight)) < f
+        X[window][alight] = 2
+        front[window] = alight
+        burning = int(np.count_nonzero(alight))
+        burnt += burning
+        trees -= burning
+        rows = np.flatnonzero(alight.any(axis=1)) + top
+        cols = np.flatnonzero(alight.any(axis=0)) + left
+        if burning > 0:
+            edge = edge or rows[0] == 0 or rows[-1] == ny - 1 or cols[0] == 0 \
+                or cols[-1] == nx - 1
+            if animate == True:
+                draw(X)
+        stats.append([generation, burning, burnt, trees, bool(edge)])
+    if animate == True:
+        create_animation()
+    return pd.DataFrame(stats, columns=["Generation", "Burning", "Burnt", "Trees", "Edge"])
 
 
+def drossel_schwabl(ny, nx, g, f, steps, transient=0, every=10000,
+                    sizes_file="fire_sizes.csv", series_file="forest_series.csv",
+                    animate=False, frames=100, rng=None):
+    """Run the Drossel-Schwabl forest fire for 'steps' generations on an ny
+    by nx forest, with mud (1) growing a tree (0) with probability g and a
+    tree struck by lightning with probability f.  Every 'every' generations
+    the distribution of the sizes of the fires finished since the first
+    'transient' generations is written to 'sizes_file' and the density of
+    trees and of fire is appended to 'series_file'.  Returns the counts of
+    the fire sizes, indexed by size."""
+    if rng is None:
+        rng = np.random.default_rng()
+    ## In every generation, all at once: a cell on fire (2) burns out to mud,
+    ## a tree next to fire (of its 8 neighbours) catches fire, any other tree
+    ## catches fire when struck by lightning, and mud grows a tree.  Each
+    ## fire is given a number when lightning starts it and every tree it sets
+    ## alight takes that number, so that its size, the number of trees it
+    ## burns, is known when it goes out.  A tree set alight by two fires at
+    ## once is counted in the one started later.
+    ##
+    ## Only the cells which change are written.  The cells on fire are kept as
+    ## a list, and the trees next to them are found from a mask of the fire
+    ## and its shifts.  The cells struck by lightning or growing a tree are
+    ## a Poisson number of cells picked at random, at a rate of -log(1 - q)
+    ## per cell, so every cell is picked with probability exactly q.
+    ## Every change is found from the old forest before any is written, so
+    ## the forest is updated in place as if from a second copy.  It is kept
+    ## with a border of mud one cell wide, which never catches fire.
+    w = nx + 2
+    X = np.ones((ny + 2, w), dtype=np.int8)
+    X[1:-1, 1:-1] = rng.random((ny, nx)) >= 0.5
+    forest = X.reshape(-1)
+    # The number of the fire burning in each cell
+    number = np.zeros(forest.size, dtype=np.int64)
+    # Offsets of the 8 neighbours of a cell in the flattened forest
+    offsets = np.array([-w - 1, -w, -w + 1, -1, 1, w - 1, w, w + 1])
+    grow = -np.log1p(-min(g, 1 - 1e-16)) * ny * nx
+    strike = -np.log1p(-min(f, 1 - 1e-16)) * ny * nx
+    front = np.zeros(0, dtype=np.int64)
+    # The cells on fire, and buffers for the trees next to them
+    B = np.zeros((ny + 2, w), dtype=bool)
+    near = np.empty((ny, nx), dtype=bool)
+    tree = np.empty((ny, nx), dtype=bool)
+    neighbours = [(slice(a, a + ny), slice(b, b + nx)) for a in range(3) for b in range(3)
+                  if (a, b) not in ((0, 0), (0, 1), (1, 1))]
+    fires = 0
+    active = {}
+    counts = np.zeros(ny * nx + 1, dtype=np.int64)
+    finished = []
+    with open(series_file, "w") as series:
+        series.write("Step,Trees,Burning,Fires\n")
+    for step in range(1, int(steps) + 1):
+        ## The trees next to the fire catch fire, with the number of the
+        ## latest fire next to them.
+        np.logical_or(B[:-2, :-2], B[:-2, 1:-1], out=near)
+        for a, b in neighbours:
+            np.logical_or(near, B[a, b], out=near)
+        np.equal(X[1:-1, 1:-1], 0, out=tree)
+        np.logical_and(near, tree, out=near)
+        cells = padded(np.flatnonzero(near), nx)
+        numbers = number[cells + offsets[0]]
+        for offset in offsets[1:]:
+            np.maximum(numbers, number[cells + offset], out=numbers)
+        ## Mud grows trees, and lightning strikes the trees not already
+        ## catching fire.
+        grown = padded(rng.integers(0, ny * nx, rng.poisson(grow)), nx)
+        grown = grown[forest[grown] == 1]
+        struck = padded(rng.integers(0, ny * nx, rng.poisson(strike)), nx)
+        forest[cells] = 2
+        struck = np.unique(struck[forest[struck] == 0])
+        new = np.arange(fires + 1, fires + 1 + len(struck))
+        fires += len(struck)
+        ## The rest of the next generation.
+        forest[front] = 1
+        forest[grown] = 0
+        forest[struck] = 2
+        number[front] = 0
+        number[cells] = numbers
+        number[struck] = new
+        B.reshape(-1)[front] = False
+        front = np.concatenate((cells, struck))
+        B.reshape(-1)[front] = True
+        ## Add the trees set alight to their fires, and record the fires
+        ## which have gone out.
+        burning = []
+        if len(numbers):
+            lowest = numbers.min()
+            size = np.bincount(numbers - lowest)
+            burning = (np.flatnonzero(size) + lowest).tolist()
+            for n in burning:
+                active[n] += int(size[n - lowest])
+        for n in new.tolist():
+            active[n] = 1
+        if len(active) > len(burning) + len(new):
+            alight = set(burning)
+            alight.update(new.tolist())
+            for n in [n for n in active if n not in alight]:
+                s = active.pop(n)
+                if step > transient:
+                    finished.append(s)
+        if animate == True and step % frames == 0:
+            draw(X[1:-1, 1:-1])
+        if step % every == 0 or step == int(steps):
+            ## Stream the statistics to disk.
+            if finished:
+                np.add.at(counts, np.minimum(finished, ny * nx), 1)
+                finished = []
+            write_sizes(sizes_file, counts)
+            with open(series_file, "a") as series:
+                series.write("%d,%.6f,%.6f,%d\n" % (step,
+                                                    np.count_nonzero(X == 0) / (ny * nx),
+                                                    len(front) / (ny * nx), counts.sum()))
+    if animate == True:
+        create_animation()
+    return counts
 
-def iterate(X, ny, nx, f):
-    """Iterate the forest according to the forest-fire rules."""
 
-    # the number one corresponds to a tree and number 2 corresponds to fire
-    set_alight = [1, 2]
-    # the list of numbers corresponds to the likelihood of setting a tree on fire
-    weighting = [(1-f), f]
-    df = pd.DataFrame(X)
-    draw(X)
-    while 1 in df.values:
-        for ix in range(0, nx):
-            for iy in range(0, ny):
-                if X[iy, ix] == 0:
-                    X[iy, ix] = choice(set_alight, p=weighting)
-                    draw(X)
-                    break
-    draw(X)
-    create_animation()
+def padded(cells, nx):
+    ## The index in the flattened forest, with its border, of each cell of
+    ## the flattened forest without it.
+    return cells + (cells // nx) * 2 + nx + 3
 
 
+def write_sizes(sizes_file, counts):
+    ## Writes the counts of every fire size seen, under another name first
+    ## so that a reader never sees half a file.
+    sizes = np.flatnonzero(counts)
+    with open(sizes_file + ".tmp", "w") as out:
+        out.write("Size,Count\n")
+        for s in sizes:
+            out.write("%d,%d\n" % (s, counts[s]))
+    os.replace(sizes_file + ".tmp", sizes_file)
 
 
 def draw(data):
-    # Colours for visualization: green for trees, brown for mud and orange for fire.
-    # module is poorly coded so colours and boundary array each need one more
-    # element than there are colours in the animation and numbers in the matrix.
-    colors_list = ['green', 'brown', 'black', 'orange']
-    # observe that the colour black appears nowhere in the animation and neither
-    # does the number three appear anywhere within the matrix,
-    # i do not know why the developer indexes the arrays incorrectly.
-    # create discrete colormap
-    cmap = colors.ListedColormap(colors_list)
-    bounds = [0, 1, 2, 3]
-    norm = colors.BoundaryNorm(bounds, cmap.N)
-    global ims
-    plt.xticks([])
-    plt.yticks([])
-    im = plt.imshow(data, cmap=cmap, norm=norm, animated=True)
-    ims.append([im])
+    recorder.draw(data)
 
 
 def create_animation():
-    print(ims)
-    print("\nCreating animation, please wait...")
-    ani = animation.ArtistAnimation(fig, ims, blit=True)
-    ani.save(filename, writer=writer)
-    # OS X
-    if platform == "darwin":
-        try:
-            os.system("open " + shlex.quote(filename))
-        except:
-            print("You will need to manually open the html file")
-    # Windows
-    elif platform == "win32":
-        try:
-            os.system("start " + filename)
-        except:
-            print("You will need to manually open the html file")
+    recorder.finish()
 
 
 def main():
+    # Which model to run: "spontaneous" burns one forest from its centre and
+    # "drossel-schwabl" grows and burns the forest for many generations
+    model = "spontaneous"
     # The number of simulation replications.
     nrep = 1
-    simulation(nrep)
+    # Would you like to animate the fire, one frame for each generation
+    animate = True
+    if model == "drossel-schwabl":
+        # Forest size (number of cells in x and y directions).
+        ny, nx = 256, 256
+        # Probabilities of mud growing a tree and of lightning striking a tree
+        g, f = 0.05, 1e-5
+        # Generations to run, of which the first are left out of the sizes
+        steps = 10**6
+        transient = 10**4
+        # Draw a frame every 'frames' generations when animating
+        frames = 1000
+        counts = drossel_schwabl(ny, nx, g, f, steps, transient, animate=animate, frames=frames)
+        print("Fires: " + str(counts.sum()) + ", mean size: "
+              + str(np.dot(np.arange(len(counts)), counts) / max(counts.sum(), 1)))
+    else:
+        simulation(nrep, animate)
     print("exit")
 
 
@@ -36,6 +36,8 @@ import shlex
 import pandas as pd
 from openpyxl import load_workbook
 
+from percolate.search import critical_density
+
 filename = "dynamic_images.html"
 # change the fps to speed up or slow down the animation
 writer = animation.HTMLWriter(fps=4)
@@ -136,16 +138,28 @@ def main():
     # Determines whether to create new animation at each level of density or to
     # append the new frames to the existing animation.
     separate = True
+    # Search for the density at which the bottom is reached with frequency
+    # 'level' instead of sweeping the densities, using max(nrep) replications
+    search = False
+    level = 0.5
     # Grid size
     sizes = [10,50,100,200,400]
     ## The number of simulation replications.
     nrep = [100,500,1000,2000,4000]
     # By how much is p decremented for each realisation
     step = 0.01
-    pc = pd.DataFrame(columns=["Size", "Crit_Perc"])
+    pc = pd.DataFrame(columns=["Size", "Crit_Perc", "Half_Width"])
     for N in sizes:
         excel_file = "percolation" + str(N) + ".xlsx"
         print("\nThe grid size is: " + str(N) + "x" + str(N))
+        if search == True:
+            critperc, half = critical_density(
+                lambda q, n: simulation(q, N, n, False, False)[0], level, max(nrep))
+            print("The critical density is: " + str(round(critperc, 4)) + " +/- "
+                  + str(round(half, 4)))
+            pc.loc[sizes.index(N)] = [N, critperc, half]
+            print(pc)
+            continue
         for i in nrep:
             pc_boolean = True
             i = round(i)
@@ -201,7 +215,7 @@ def main():
             plt.xticks(np.arange(0, 1+step, step=0.1))
             plt.yticks(np.arange(0, 1.1, step=0.1))
             plt.show()
-        pc.loc[sizes.index(N)] = [N, critperc]
+        pc.loc[sizes.index(N)] = [N, critperc, np.nan]
         print(pc)
     pc.plot(x='Size', y='Crit_Perc', kind='scatter')
     plt.title("Critical Percolation against Matrix Size \nNumber of Realisations " + str(i))
@@ -31,11 +31,15 @@ import matplotlib.pyplot as plt
 import matplotlib.animation as animation
 from matplotlib import colors
 import os
+import time
 from sys import platform
 import shlex
 import pandas as pd
 from openpyxl import load_workbook
 
+from percolate import search
+from percolate.timing import clear, record, report
+
 filename = "dynamic_images.html"
 # change the fps to speed up or slow down the animation
 writer = animation.HTMLWriter(fps=4)
@@ -60,10 +64,15 @@ def simulation(p, N, nrep, animate, separate):
     ## The number of times that the bottom is reached.
     NB = 0
 
+    ## Seconds spent laying out the rocks and walking the droplet.
+    grid = walk = 0.0
+
     ## Simulation replications.
     for j in range(int(nrep)):
+        start = time.perf_counter()
         ## Randomly lay out the rocks.
         M = (1 * (np.random.uniform(0, 1, size=N * N) < p)).reshape(N, N)
+        generated = time.perf_counter()
 
         ## The initial position of the droplet.
         r = 0
@@ -116,11 +125,16 @@ def simulation(p, N, nrep, animate, separate):
 
         ## Keep track of the total of the final depths.
         TD = TD + r
+        grid += generated - start
+        walk += time.perf_counter() - generated
 
         # Draws the final frame of each simulation for a number of realisations
         if animate == True:
             draw(M, j + 1, p, N)
 
+    record("grid", grid, int(nrep))
+    record("walk", walk, int(nrep))
+
     ## Draws the final frame of the last simulation for number of realisations
     ## to allow enough time for the user to pause the animation
     if animate == True:
@@ -136,6 +150,11 @@ def main():
     # Determines whether to create new animation at each level of density or to
     # append the new frames to the existing animation.
     separate = True
+    # Stop the replications for a density early once the frequency with which
+    # the bottom is reached is known to within 'width'.  Off by default, as the
+    # densities then use different numbers of realisations.
+    sequential = False
+    width = 0.02
     # Grid size
     sizes = [10,50,100,200,400]
     ## The number of simulation replications.
@@ -146,26 +165,35 @@ def main():
         excel_file = "percolation" + str(N) + ".xlsx"
         print("\nThe grid size is: " + str(N) + "x" + str(N))
         for i in nrep:
+            clear()
+            block = time.perf_counter()
             pc_boolean = True
             i = round(i)
             print("\nRunning simulation with " + str(i) + " realisations")
             ## The density of rocks in the sand.
             p = 1
-            df = pd.DataFrame(columns=["Density", "Number_Bottom", "Frequency_Reach_Bottom", "Total_Depth", "Average_Depth"])
+            df = pd.DataFrame(columns=["Density", "Number_Bottom", "Frequency_Reach_Bottom", "Total_Depth", "Average_Depth", "Realisations_Used"])
             j = 0
             while p > 0:
                 p = round(p, 2)
-                sim = simulation(p, N, i, animate, separate)
+                if sequential == True and animate == False:
+                    sim = search.sequential(lambda m: simulation(p, N, m, False, False), i, width)
+                    used = sim[2]
+                else:
+                    sim = simulation(p, N, i, animate, separate)
+                    used = i
                 NB = sim[0]
                 TD = sim[1]
                 ## The estimated probability that we reach the bottom.
                 ## Frequency with which the bottom is reached at each probability
-                NBprob = NB / i
+                NBprob = NB / used
 
                 ## The average depth that is reached.
-                TDavg = TD / i
+                TDavg = TD / used
 
-                df.loc[j] = [p, NB, NBprob, TD, TDavg]
+                start = time.perf_counter()
+                df.loc[j] = [p, NB, NBprob, TD, TDavg, used]
+                record("append", time.perf_counter() - start)
                 j += 1
 
                 if pc_boolean and NB >= 1:
@@ -173,6 +201,7 @@ def main():
                     pc_boolean = False
                 p -= step
 
+            start = time.perf_counter()
             if nrep.index(i) == 0:
                 with pd.ExcelWriter(excel_file) as writer:
                     writer.save()
@@ -189,9 +218,13 @@ def main():
                     writer.save()
             except PermissionError:
                 print("Please ensure the file '" + str(excel_file) + "' is not open in another program")
+            record("excel", time.perf_counter() - start)
 
             print(df)
             print(critperc)
+            print("Replications used: " + str(int(df['Realisations_Used'].sum())) + " of "
+                  + str(i * len(df)))
+            start = time.perf_counter()
             df.plot(x='Density', y='Frequency_Reach_Bottom', kind='scatter')
             plt.title("Water Percolation - " + str(i) + " Realisations - " + str(N) + "x" + str(N) + " Grid")
             plt.xlim(0, 1)
@@ -201,9 +234,12 @@ def main():
             plt.xticks(np.arange(0, 1+step, step=0.1))
             plt.yticks(np.arange(0, 1.1, step=0.1))
             plt.show()
+            record("plot", time.perf_counter() - start)
+            report("percolation", N, i, time.perf_counter() - block)
 
 
 def draw(data, j, p, N):
+    start = time.perf_counter()
     # Colours for visualization: gold for sand, grey for rock and blue for water.
     # module is poorly coded so colours and boundary array each need one more
     # element than there are colours in the animation and numbers in the matrix.
@@ -222,12 +258,15 @@ def draw(data, j, p, N):
               + str(j) + "\nSize of matrix: " + str(N) + "x" + str(N))
     im = plt.imshow(data, cmap=cmap, norm=norm, animated=True)
     ims.append([im])
+    record("draw", time.perf_counter() - start)
 
 
 def create_animation():
     print("\nCreating animation, please wait...")
+    start = time.perf_counter()
     ani = animation.ArtistAnimation(fig, ims, blit=True)
     ani.save(filename, writer=writer)
+    record("animation", time.perf_counter() - start)
     # OS X
     if platform == "darwin":
         try:
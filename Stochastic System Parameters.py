@@ -28,32 +28,39 @@ Created on Thu Feb 13 20:23:33 2020
 ## drop reaches the bottom layer.
 
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
-from matplotlib import colors
 import os
-from sys import platform
+from sys import platform, argv
 import shlex
-import pandas as pd
-from openpyxl import load_workbook
-import seaborn as sns
+
+from percolate.sweep import cells, run
+from percolate.report import save_results, export_xlsx
 
 filename = "dynamic_images.html"
 
 # change the fps to speed up or slow down the animation
-writer = animation.HTMLWriter(fps=4)
+fps = 4
 
-# ensure matrix and data frame are not truncated
+# ensure matrix is not truncated
 np.set_printoptions(threshold=np.inf)
-pd.set_option('display.max_columns', None)
-pd.set_option('display.max_rows', None)
-fig = plt.figure()
+
+# matplotlib, seaborn, pandas and openpyxl take over a second to import and
+# matplotlib wants a display, so they are imported by tables() and plotting()
+# when first needed.  A headless run, and the worker processes of the sweep,
+# only ever import numpy.
+plt = animation = colors = sns = None
+pd = load_workbook = None
+# the figure is made when the first frame of an animation is drawn
+fig = None
 
 # array of images
 ims = []
 
 
-def simulation(p, N, nrep, animate, separate):
+def simulation(p, N, nrep, animate, separate, rng=None):
+    # The random stream to draw from, numpy's global one unless a
+    # numpy.random.Generator is given.
+    random = np.random if rng is None else rng
+
     if separate == True:
         # empties animation array after change in density of rock in the sand.
         global ims
@@ -68,7 +75,7 @@ def simulation(p, N, nrep, animate, separate):
     ## Simulation replications.
     for j in range(int(nrep)):
         ## Randomly lay out the rocks.
-        M = (1 * (np.random.uniform(0, 1, size=N * N) < p)).reshape(N, N)
+        M = (1 * (random.uniform(0, 1, size=N * N) < p)).reshape(N, N)
 
         ## The initial position of the droplet.
         r = 0
@@ -136,22 +143,52 @@ def simulation(p, N, nrep, animate, separate):
     return NB, TD
 
 
-def main():
+def sweep(sizes, nrep, step, workers=None, seed=None,
+          journal="percolation_journal.jsonl"):
+    """Run every (size, realisations, density) cell of the sweep in main()
+    on the fastest engine of the percolate package, across a pool of worker
+    processes, journalled so that an interrupted sweep resumes where it
+    stopped.  Returns a dictionary of the number of times that the bottom is
+    reached and the total depth, keyed by ("droplet", size, realisations,
+    density)."""
+    wanted = cells({"model": "droplet", "sizes": [round(n) for n in sizes],
+                    "realisations": nrep, "start": 1, "stop": step, "step": step})
+    return run(wanted, workers=workers, seed=seed, journal=journal)
+
+
+def main(headless=False):
     # Would you like to animate the simulations, please note this may take a while
     animate = True
     # Determines whether to create new animation at each level of density or to
     # append the new frames to the existing animation.
     separate = True
+    # Number of processes running the simulations, None uses every core
+    workers = None
+    # Seed for the random streams, set to an integer to reproduce a sweep
+    seed = None
+    # Journal of finished cells, an interrupted sweep picks up from it when
+    # run again, delete it to start a new sweep
+    journal = "percolation_journal.jsonl"
     # Grid size
     sizes = [10, 50, 100, 200, 400]
     ## The number of simulation replications.
     nrep = [100, 500, 1000, 2000, 4000]
     # By how much is p decremented for each realisation
     step = 0.1
+    if headless:
+        # Only the numbers: every cell is run into the journal, from which a
+        # later run without animation makes the tables and plots at once.
+        results = sweep(sizes, nrep, step, workers, seed, journal)
+        print("Finished " + str(len(results)) + " cells, recorded in " + journal)
+        return
+    tables()
+    plotting()
     pc = pd.DataFrame(columns=["Grid Size", "Realisations", "Crit_Perc"])
     k = 0
+    ## Without animation every cell of the sweep is run up front in parallel.
+    if animate == False:
+        results = sweep(sizes, nrep, step, workers, seed, journal)
     for N in sizes:
-        excel_file = "percolation" + str(N) + ".xlsx"
         print("\nThe grid size is: " + str(N) + "x" + str(N))
         for i in nrep:
             pc_boolean = True
@@ -165,7 +202,10 @@ def main():
             j = 0
             while p > 0:
                 p = round(p, 2)
-                sim = simulation(p, N, i, animate, separate)
+                if animate == False:
+                    sim = results[("droplet", N, i, p)]
+                else:
+                    sim = simulation(p, N, i, animate, separate)
 
                 NB = sim[0]
                 TD = sim[1]
@@ -186,24 +226,7 @@ def main():
                     pc_boolean = False
                 p -= step
 
-            if nrep.index(i) == 0:
-                with pd.ExcelWriter(excel_file) as writer:
-                    writer.save()
-                    print("Created the excel file " + str(excel_file))
-            try:
-                with pd.ExcelWriter(excel_file, engine='openpyxl', mode='a') \
-                        as writer:
-                    writer.book = load_workbook(excel_file)
-                    sheetName = str(i) + 'realisations' + str(N) + "by" + str(N)
-                    df.to_excel(writer, sheetName, index=False, header=True)
-                    try:
-                        writer.book.remove(writer.book['Sheet1'])
-                    except KeyError:
-                        pass
-                    writer.save()
-            except PermissionError:
-                print("Please ensure the file '" + str(excel_file) +
-                      "' is not open in another program")
+            save_results(df, "percolation", N, i)
 
             print(df)
             df.plot(x='Density', y='Frequency_Reach_Bottom', kind='scatter')
@@ -256,7 +279,29 @@ def main():
               "is not open in another program")
 
 
+def tables():
+    ## Imports pandas and openpyxl the first time a data frame is needed.
+    global pd, load_workbook
+    if pd is None:
+        import pandas as pd
+        from openpyxl import load_workbook
+        # ensure data frame is not truncated
+        pd.set_option('display.max_columns', None)
+        pd.set_option('display.max_rows', None)
+
+
+def plotting():
+    ## Imports matplotlib and seaborn the first time anything is drawn.
+    global plt, animation, colors, sns
+    if plt is None:
+        import matplotlib.pyplot as plt
+        import matplotlib.animation as animation
+        from matplotlib import colors
+        import seaborn as sns
+
+
 def draw(data, j, p, N):
+    plotting()
     # Colours for visualization: gold for sand, grey for rock and blue for water.
     # module is poorly coded so colours and boundary array each need one more
     # element than there are colours in the animation and numbers in the matrix.
@@ -268,7 +313,9 @@ def draw(data, j, p, N):
     cmap = colors.ListedColormap(colors_list)
     bounds = [0, 1, 2, 3]
     norm = colors.BoundaryNorm(bounds, cmap.N)
-    global ims
+    global ims, fig
+    if fig is None:
+        fig = plt.figure()
     plt.xticks([])
     plt.yticks([])
     plt.title("Density of mud in the forest: " + str(p)
@@ -281,7 +328,7 @@ def draw(data, j, p, N):
 def create_animation():
     print("\nCreating animation, please wait...")
     ani = animation.ArtistAnimation(fig, ims, blit=True)
-    ani.save(filename, writer=writer)
+    ani.save(filename, writer=animation.HTMLWriter(fps=fps))
     # OS X
     if platform == "darwin":
         try:
@@ -297,4 +344,12 @@ def create_animation():
 
 
 if __name__ == '__main__':
-    main()
+    # 'export-xlsx' writes the stored results out as Excel workbooks instead,
+    # in results/workbooks, and 'export-xlsx force' overwrites those there
+    if argv[1:2] == ["export-xlsx"]:
+        export_xlsx("percolation", force=argv[2:] == ["force"])
+    # 'headless' only runs the sweep into the journal, with no tables or plots
+    elif argv[1:] == ["headless"]:
+        main(headless=True)
+    else:
+        main()
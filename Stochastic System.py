@@ -35,6 +35,10 @@ from sys import platform
 import shlex
 import pandas as pd
 
+# The engines are those of the percolate package.  numba is optional, without
+# it the droplets are walked by the batched engine.
+from percolate.droplet import njit, simulation_batch, simulation_compiled, simulation_packed
+
 filename = "dynamic_images.html"
 # change the fps to speed up or slow down the animation
 writer = animation.HTMLWriter(fps=4)
@@ -45,7 +49,18 @@ fig = plt.figure()
 ims = []
 
 
-def simulation(p, N, nrep, animate, separate):
+def simulation(p, N, nrep, animate, separate, engine="compiled"):
+    ## Without animation there are no frames to draw, so the replications
+    ## are run by the chosen engine: "packed" walks lattices of one bit per
+    ## cell and "compiled" uses the numba kernel, the batched engine running
+    ## the replications together in its place when numba is not installed.
+    if animate == False:
+        if engine == "packed":
+            return simulation_packed(p, N, nrep)
+        if engine == "compiled" and njit is not None:
+            return simulation_compiled(p, N, nrep)
+        return simulation_batch(p, N, nrep)
+
     if separate == True:
         # empties animation array after each change in density of rocks in the sand.
         global ims
@@ -133,6 +148,9 @@ def main():
     # Determines whether to create new animation at each level of density or to
     # append the new frames to the existing animation.
     separate = True
+    # Which engine runs the replications when not animating: "compiled",
+    # "batch" or "packed", which keeps one bit per cell of the lattice
+    engine = "compiled"
     ## The density of rocks in the sand.
     p = 1
     # Grid size
@@ -146,7 +164,7 @@ def main():
         j = 0
         while p > 0:
             p = round(p, 2)
-            sim = simulation(p, N, i, animate, separate)
+            sim = simulation(p, N, i, animate, separate, engine)
             NB = sim[0]
             TD = sim[1]
             ## The estimated probability that we reach the bottom.
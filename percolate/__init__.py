@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+"""
+Simulation engines and sweeps of the droplet and forest fire models.
+"""
+## The engines hold one copy of each model, and the sweeps run any set of
+## grid sizes, realisations and densities on them across a pool of worker
+## processes.  Run "python -m percolate --help" for the command line.
+from .sweep import densities, cells, simulation, run, read_journal
+from .report import report
+
+__all__ = ["densities", "cells", "simulation", "run", "read_journal", "report"]
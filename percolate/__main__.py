@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+Command line running any sweep of the droplet and forest fire models.
+"""
+## Describe one sweep with the options, e.g.
+##
+##     python -m percolate droplet --sizes 10 50 100 --realisations 100 500
+##
+## or any number of sweeps in JSON config files, e.g.
+##
+##     python -m percolate --config configs/stochastic_graphing.json
+##
+## A config file holds a list of sweeps, each a dictionary with the same
+## names as the options, or a dictionary with that list under "sweeps" and
+## any of "workers", "seed", "journal", "cache" and "cache_size".  The cells
+## shared by the sweeps of one invocation are only run once, and with a
+## seed the cells run by earlier invocations are read from the cache.
+import json
+import argparse
+
+from .sweep import cells, run, defaults
+from .report import report
+
+
+def arguments(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m percolate",
+                                     description="Run sweeps of the droplet and forest fire models.")
+    parser.add_argument("model", nargs="?", choices=["droplet", "forest"],
+                        help="model of a single sweep given by the options below")
+    parser.add_argument("--config", action="append", default=[],
+                        help="JSON file of sweeps to run, may be given more than once")
+    parser.add_argument("--sizes", type=int, nargs="+", help="grid sizes")
+    parser.add_argument("--realisations", type=float, nargs="+",
+                        help="numbers of simulation replications")
+    parser.add_argument("--start", type=float, help="highest density, default 1")
+    parser.add_argument("--stop", type=float, help="lowest density, default 0")
+    parser.add_argument("--step", type=float, help="step between densities, default 0.01")
+    parser.add_argument("--plot", choices=["blocks", "sizes", "critical"], nargs="+",
+                        help="plot each table, each number of realisations across "
+                             "grid sizes, or the critical densities")
+    parser.add_argument("--excel", help="workbook to write the tables to")
+    parser.add_argument("--store", action="store_true", default=None,
+                        help="keep the tables in the results store")
+    parser.add_argument("--workers", type=int, help="processes, default every core")
+    parser.add_argument("--seed", type=int, help="seed of the random streams")
+    parser.add_argument("--journal", help="journal of finished cells to resume from")
+    parser.add_argument("--cache", help="folder caching the results of cells, "
+                                        "default 'cache', 'none' for no cache")
+    parser.add_argument("--cache-size", type=float,
+                        help="megabytes the cache is kept within, default 100")
+    args = parser.parse_args(argv)
+    if not args.model and not args.config:
+        parser.error("give a model or at least one --config file")
+    return args
+
+
+def sweeps(args):
+    ## The sweeps of the config files and of the options, and the settings
+    ## of the invocation.
+    found = []
+    settings = {"workers": None, "seed": None, "journal": None,
+                "cache": "cache", "cache_size": 100}
+    for filename in args.config:
+        with open(filename) as config:
+            loaded = json.load(config)
+        if isinstance(loaded, dict):
+            settings.update({k: loaded[k] for k in settings if k in loaded})
+            loaded = loaded["sweeps"]
+        found.extend(loaded)
+    if args.model:
+        found.append({k: getattr(args, k) for k in ["model"] + list(defaults)
+                      if getattr(args, k) is not None})
+    for k in settings:
+        if getattr(args, k) is not None:
+            settings[k] = getattr(args, k)
+    for n, sweep in enumerate(found):
+        for k, value in defaults.items():
+            sweep.setdefault(k, value)
+        sweep.setdefault("name", sweep["model"] + " sweep " + str(n + 1))
+    return found, settings
+
+
+def main(argv=None):
+    found, settings = sweeps(arguments(argv))
+    wanted = [cell for sweep in found for cell in cells(sweep)]
+    print("Running " + str(len(set(wanted))) + " cells for " + str(len(found))
+          + " sweeps of " + str(len(wanted)) + " cells")
+    folder = settings["cache"] if settings["cache"] not in (None, "none") else None
+    results = run(wanted, workers=settings["workers"], seed=settings["seed"],
+                  journal=settings["journal"], folder=folder,
+                  limit=int(settings["cache_size"] * 2**20))
+    for sweep in found:
+        report(results, sweep)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Animations of the forests, streamed to an html file as they are drawn.
+"""
+## Each frame is written to the file as it is drawn, so the memory used does
+## not grow with the number of frames, and the matrix is coloured straight
+## into one frame buffer through a table of RGB bytes indexed by the number
+## in each cell.  matplotlib takes over a second to import and wants a
+## display, so it is imported when the first frame is drawn.
+import os
+import shlex
+from sys import platform
+import numpy as np
+
+plt = animation = colors = None
+
+
+def plotting():
+    ## Imports matplotlib the first time a frame is drawn.
+    global plt, animation, colors
+    if plt is None:
+        import matplotlib.pyplot as plt
+        import matplotlib.animation as animation
+        from matplotlib import colors
+
+
+class Animation:
+    """The html file the frames of one script are written to, at 'fps' frames
+    a second, each cell coloured by the colour at its number in 'colours'.
+    A new animation is begun by the first frame drawn after finish()."""
+
+    def __init__(self, filename="dynamic_images.html", fps=12,
+                 colours=("green", "brown", "orange")):
+        self.filename = filename
+        self.fps = fps
+        self.colours = colours
+        # the figure, the writer and the colour table are made when the
+        # first frame is drawn
+        self.fig = self.writer = self.table = None
+        # frame buffer the matrix is coloured into and the image showing it
+        self.frame = self.im = None
+        # whether frames are currently being written to the animation
+        self.recording = False
+
+    def draw(self, data, title=None):
+        ## Colours the matrix into the frame buffer and writes it to the file.
+        if not self.recording:
+            if self.fig is None:
+                plotting()
+                self.fig = plt.figure()
+                self.writer = animation.HTMLWriter(fps=self.fps)
+                self.table = np.round(255 * np.array(
+                    [colors.to_rgb(c) for c in self.colours])).astype(np.uint8)
+            self.writer.setup(self.fig, self.filename)
+            self.recording = True
+        if self.frame is None or self.frame.shape[:2] != data.shape:
+            self.frame = np.empty(data.shape + (3,), dtype=np.uint8)
+            self.fig.clf()
+            ax = self.fig.gca()
+            ax.set_xticks([])
+            ax.set_yticks([])
+            self.im = ax.imshow(self.frame)
+        np.take(self.table, data, axis=0, out=self.frame)
+        self.im.set_data(self.frame)
+        if title is not None:
+            self.im.axes.set_title(title)
+        self.writer.grab_frame()
+
+    def finish(self):
+        ## Completes the html file and opens it where the platform allows.
+        print("\nCreating animation, please wait...")
+        self.writer.finish()
+        self.recording = False
+        # OS X
+        if platform == "darwin":
+            try:
+                os.system("open " + shlex.quote(self.filename))
+            except:
+                print("You will need to manually open the html file")
+        # Windows
+        elif platform == "win32":
+            try:
+                os.system("start " + self.filename)
+            except:
+                print("You will need to manually open the html file")
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+On-disk cache of the results of sweep cells.
+"""
+## Each result is kept in a file of its own named by the SHA-256 of its key:
+## the model, the version of its rules, the engine, the grid size, the
+## density, the number of realisations and the entropy of the random
+## streams.  The same key always holds the same numbers, so a cell is only
+## ever run once for a given seed, whichever sweep asks for it.
+##
+## Reading a result marks it as used, and once the cache holds more than
+## its limit the results used longest ago are removed first.  Results of an
+## older version of the rules are never read again and are removed first.
+import os
+import json
+import hashlib
+
+from . import droplet, forest
+
+engines = {"droplet": droplet, "forest": forest}
+
+
+def key(cell, entropy):
+    ## The key of a cell's results, as a dictionary.
+    model, N, nrep, p = cell
+    return {"model": model, "version": engines[model].version,
+            "engine": engines[model].engine(), "size": N, "density": p,
+            "realisations": nrep, "entropy": entropy}
+
+
+def path(folder, cell, entropy):
+    ## The file holding a cell's results, in a folder for each version of
+    ## the rules of each model.
+    entry = key(cell, entropy)
+    digest = hashlib.sha256(json.dumps(entry, sort_keys=True).encode()).hexdigest()
+    return os.path.join(folder, entry["model"] + "-" + str(entry["version"]),
+                        digest[:2], digest + ".json")
+
+
+def load(folder, cell, entropy):
+    ## The results of a cell, or None when they are not in the cache.
+    filename = path(folder, cell, entropy)
+    try:
+        with open(filename) as entry:
+            result = json.load(entry)
+    except (OSError, ValueError):
+        return None
+    # the modification time records when the entry was last used
+    os.utime(filename)
+    return result["NB"], result["TD"]
+
+
+def save(folder, cell, entropy, result):
+    ## Adds the results of a cell to the cache.
+    filename = path(folder, cell, entropy)
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    # written under another name first so that a reader never sees half a file
+    with open(filename + ".tmp", "w") as entry:
+        json.dump(dict(key(cell, entropy), NB=result[0], TD=result[1]), entry)
+    os.replace(filename + ".tmp", filename)
+
+
+def evict(folder, limit):
+    ## Removes results of older versions of the rules, then the results used
+    ## longest ago until the cache holds at most 'limit' bytes.
+    current = [model + "-" + str(engine.version) for model, engine in engines.items()]
+    entries = []
+    for root, dirs, files in os.walk(folder):
+        stale = os.path.relpath(root, folder).split(os.sep)[0] not in current
+        for name in files:
+            filename = os.path.join(root, name)
+            try:
+                info = os.stat(filename)
+            except OSError:
+                continue
+            entries.append((not stale, info.st_mtime, info.st_size, filename))
+    total = sum(entry[2] for entry in entries)
+    for kept, used, size, filename in sorted(entries):
+        if kept and total <= limit:
+            break
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
+        total -= size
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Distribution of the depth reached by the droplet on a bottomless strip.
+"""
+## Rather than summing the depths, every replication adds one to the count
+## of the depth at which the droplet got stuck.  The strip is laid out a row
+## at a time by the lazy walk, so it has no bottom: a droplet still moving
+## after 'depth' rows is counted in a last bin of its own and stopped.  The
+## memory is the two rows of the walk and the depth + 1 counts, however many
+## replications are run, e.g.
+##
+##     python -m percolate.depths --densities 0.3 0.4 0.5 --realisations 1e7
+##
+## prints the mean depth and fits to the tail of the survival curve
+## P(depth >= d) at each density, and writes the counts and survival curve
+## to a csv file.
+import os
+import csv
+import argparse
+import numpy as np
+from multiprocessing import Pool
+
+from .droplet import descend, njit
+
+
+def tally(rows, rng, p, depth, nrep, counts):
+    ## Adds the depth reached by each of nrep droplets to the counts, with
+    ## the droplets still moving after 'depth' rows counted in counts[depth].
+    for i in range(nrep):
+        counts[descend(rows, rng, p, depth + 1)] += 1
+
+
+if njit is not None:
+    tally = njit(tally)
+
+
+def run_chunk(job):
+    ## Runs one chunk of the replications of a density in a worker process.
+    p, nrep, width, depth, seed = job
+    counts = np.zeros(depth + 1, dtype=np.int64)
+    rows = np.empty((2, width), dtype=np.uint8)
+    tally(rows, np.random.default_rng(seed), p, depth, nrep, counts)
+    return p, counts
+
+
+def histograms(densities, nrep, width=100, depth=10000, workers=None, seed=None,
+               chunk=10**5):
+    """Count the depths reached by nrep droplets at each density, on strips
+    'width' columns wide and bottomless up to 'depth' rows.  The replications
+    are split into chunks run across a pool of worker processes, each with
+    its own random stream, and their counts added together.  Returns a
+    dictionary of the counts of each density, of length depth + 1."""
+    entropy = np.random.SeedSequence(seed).entropy
+    jobs = []
+    for p in densities:
+        for k, start in enumerate(range(0, int(nrep), chunk)):
+            key = (2, width, depth, round(p * 10**6), k)
+            jobs.append((p, min(chunk, int(nrep) - start), width, depth,
+                         np.random.SeedSequence(entropy, spawn_key=key)))
+    counts = {p: np.zeros(depth + 1, dtype=np.int64) for p in densities}
+    workers = workers or os.cpu_count()
+    with Pool(min(workers, len(jobs))) as pool:
+        for p, part in pool.imap_unordered(run_chunk, jobs):
+            counts[p] += part
+    return counts
+
+
+def survival(counts):
+    ## The fraction of droplets reaching at least each depth, P(depth >= d).
+    return np.cumsum(counts[::-1])[::-1] / counts.sum()
+
+
+def mean_depth(counts):
+    ## The mean depth, with the droplets stopped at the last row counted at
+    ## that depth, so a lower bound whenever any were stopped.
+    return float(np.dot(np.arange(len(counts)), counts) / counts.sum())
+
+
+def tail_fit(counts, minimum=10):
+    """Fit the tail of the survival curve, from where it first falls below
+    one half to the last depth still reached by 'minimum' droplets, by least
+    squares both as an exponential, P(depth >= d) ~ exp(-d / xi), and as a
+    power law, P(depth >= d) ~ d ** -tau.  Returns xi, tau and the root mean
+    square residual of the logarithm for each, all nan when the tail has
+    fewer than three points."""
+    S = survival(counts)
+    reached = np.cumsum(counts[::-1])[::-1]
+    d = np.arange(len(counts))
+    tail = (S < 0.5) & (reached >= minimum) & (d > 0) & (d < len(counts) - 1)
+    fit = {"xi": np.nan, "xi_residual": np.nan, "tau": np.nan, "tau_residual": np.nan}
+    if np.count_nonzero(tail) < 3:
+        return fit
+    y = np.log(S[tail])
+    for name, x in (("xi", d[tail]), ("tau", np.log(d[tail]))):
+        slope, intercept = np.polyfit(x, y, 1)
+        fit[name] = -1 / slope if name == "xi" else -slope
+        fit[name + "_residual"] = float(np.sqrt(np.mean((y - slope * x - intercept)**2)))
+    return fit
+
+
+def write_csv(filename, counts):
+    ## Writes the counts and survival curve of every density, one row for
+    ## each depth reached by any droplet.
+    with open(filename, "w", newline="") as out:
+        rows = csv.writer(out)
+        rows.writerow(["Density", "Depth", "Count", "Survival"])
+        for p, c in counts.items():
+            S = survival(c)
+            for d in np.flatnonzero(S > 0):
+                rows.writerow([p, d, c[d], S[d]])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m percolate.depths",
+                                     description="Depth distribution of the droplet "
+                                                 "on a bottomless strip.")
+    parser.add_argument("--densities", type=float, nargs="+", required=True,
+                        help="densities of rock in the sand")
+    parser.add_argument("--realisations", type=float, default=10**6,
+                        help="replications at each density, default 10^6")
+    parser.add_argument("--width", type=int, default=100, help="columns of the strip")
+    parser.add_argument("--depth", type=int, default=10000,
+                        help="rows after which a droplet still moving is stopped")
+    parser.add_argument("--workers", type=int, help="processes, default every core")
+    parser.add_argument("--seed", type=int, help="seed of the random streams")
+    parser.add_argument("--out", default="depths.csv", help="csv file of the counts")
+    args = parser.parse_args(argv)
+    counts = histograms(args.densities, int(args.realisations), args.width, args.depth,
+                        args.workers, args.seed)
+    print("%8s %12s %12s %10s %10s %10s" % ("Density", "Mean_Depth", "Stopped",
+                                            "Xi", "Tau", "Tail"))
+    for p, c in counts.items():
+        fit = tail_fit(c)
+        # the better of the two fits by residual
+        if np.isnan(fit["xi_residual"]):
+            better = "-"
+        else:
+            better = "exp" if fit["xi_residual"] <= fit["tau_residual"] else "power"
+        print("%8g %12.4f %12d %10.4g %10.4g %10s" % (p, mean_depth(c), c[-1],
+                                                      fit["xi"], fit["tau"], better))
+    write_csv(args.out, counts)
+    print("Wrote the counts to " + args.out)
+
+
+if __name__ == '__main__':
+    main()
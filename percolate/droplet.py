@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+"""
+Engines for the droplet percolating down through sand and rock.
+"""
+## A drop of liquid starts in the middle of the top layer (row 0, column
+## N/2 - 1) of an N by N grid where each space holds rock with probability
+## p.  It moves straight down if it can, else down/left, else down/right,
+## else right, and is stuck when none of these moves can be made.
+##
+## Every engine returns the number of times that the bottom is reached
+## and the total of the final depths across the replications, and draws
+## from the numpy.random.Generator it is given.
+##
+## The droplet only ever looks at the row it is on and the row below, and
+## never climbs back up, so the lazy engine lays out each row of rocks only
+## when the droplet first reaches the row above it and keeps just those two
+## rows.  Every cell the droplet can see is still drawn once and
+## independently, so the statistics are those of the full grid, at a cost
+## of the depth reached times the width rather than the width squared.
+import numpy as np
+
+from .lattice import bernoulli, pack_lattice
+# numba is optional, without it the droplets are walked by the batched engine
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# Version of the rules of the walk, to be raised whenever a change to an
+# engine alters its results so that cached results are no longer used
+version = 4
+
+
+def engine():
+    ## The name of the engine used by simulation().
+    return "lazy" if njit is not None else "batch"
+
+
+def simulation(p, N, nrep, rng=None):
+    ## The fastest engine available: the compiled lazy kernel when numba is
+    ## installed, otherwise the batched numpy walk.
+    if njit is not None:
+        return simulation_lazy(p, N, nrep, rng)
+    return simulation_batch(p, N, nrep, rng=rng)
+
+
+def simulation_batch(p, N, nrep, batch=2**22, rng=None):
+    if rng is None:
+        rng = np.random.default_rng()
+
+    ## The total depth across the simulation replications.
+    TD = 0
+
+    ## The number of times that the bottom is reached.
+    NB = 0
+
+    nrep = int(nrep)
+    ## Number of droplets walked at once, limited so that the two rows kept
+    ## for each come to roughly 'batch' cells.
+    size = max(1, min(nrep, batch // (2 * N)))
+    done = 0
+    while done < nrep:
+        n = min(size, nrep - done)
+        r = walk_batch(p, N, n, rng)
+        ## Keep track of how often we reach the bottom.
+        NB = NB + int(np.count_nonzero(r == N - 1))
+        ## Keep track of the total of the final depths.
+        TD = TD + int(r.sum())
+        done += n
+    return NB, TD
+
+
+def walk_batch(p, N, n, rng):
+    ## Let n droplets percolate through the rocks together, each on a grid
+    ## of its own.  Returns the final row reached by each droplet.
+    ##
+    ## A droplet only ever looks at up to four cells in a step, so rather
+    ## than laying out whole grids each cell is laid out the first time a
+    ## droplet looks at it and remembered for when it looks again.  It only
+    ## ever looks at the row it is on and the row below, so the cells of row
+    ## r are kept in slot r % 2 of two rows per droplet, stamped with r, and
+    ## a cell is known when its stamp matches.  Every cell is still rock
+    ## independently with probability p, whether or not the droplet goes on to
+    ## use it, so the statistics are those of the full grid, for at most four
+    ## random draws a step instead of N * N a grid.
+    rock = np.zeros(n * 2 * N, dtype=bool)
+    stamp = np.full(n * 2 * N, -1, dtype=np.int32)
+
+    ## The initial position of each droplet.
+    r = np.zeros(n, dtype=np.int64)
+    c = np.full(n, int(N / 2) - 1, dtype=np.int64)
+
+    ## Droplets which have neither reached the bottom nor got stuck.
+    i = np.arange(n)[np.full(n, N > 1)]
+    while len(i) > 0:
+        ri, ci = r[i], c[i]
+        k = len(i)
+        ## The cells below, below/left, below/right and right of each
+        ## droplet, laying out those not yet looked at.  A cell can appear
+        ## twice at the sides of the grid, when it is laid out twice but
+        ## only the last value is kept and read back.
+        rows = np.concatenate((ri + 1, ri + 1, ri + 1, ri))
+        cols = np.concatenate((ci, np.maximum(ci - 1, 0), np.minimum(ci + 1, N - 1),
+                               np.minimum(ci + 1, N - 1)))
+        cell = (np.tile(i, 4) * 2 + rows % 2) * N + cols
+        new = stamp[cell] != rows
+        fresh = cell[new]
+        rock[fresh] = bernoulli(p, np.empty(len(fresh), dtype=bool), rng)
+        stamp[fresh] = rows[new]
+        free = ~rock[cell]
+        ## Droplets on the last column would index outside of the grid when
+        ## looking right, which stops them as the scalar walk does.
+        edge = ci == N - 1
+
+        ## Always go straight down if possible.
+        down = free[:k]
+        ## Next try down/left.
+        left = ~down & (ci > 1) & free[k:2 * k]
+        rest = ~down & ~left & ~edge
+        ## Next try down/right.
+        right = rest & free[2 * k:3 * k]
+        ## Next try right.
+        across = rest & ~right & free[3 * k:]
+
+        r[i] = ri + (down | left | right)
+        c[i] = ci - left + right + across
+        ## We're stuck, or we've reached the bottom.
+        i = i[(down | left | right | across) & (r[i] < N - 1)]
+    return r
+
+
+def simulation_compiled(p, N, nrep, rng=None):
+    if rng is None:
+        rng = np.random.default_rng()
+    # The grid is allocated once and refilled by the kernel for every replication.
+    M = np.empty((N, N), dtype=np.uint8)
+    NB, TD = droplets(M, rng, p, int(nrep))
+    return int(NB), int(TD)
+
+
+def droplet(M, rng, p):
+    ## Randomly lay out the rocks in the preallocated grid, then let the
+    ## droplet percolate through them.  Returns whether the bottom is
+    ## reached and the final depth.
+    N = M.shape[0]
+    for a in range(N):
+        for b in range(N):
+            M[a, b] = rng.random() < p
+
+    ## The initial position of the droplet.
+    r = 0
+    c = int(N / 2) - 1
+    while r < N - 1:
+        ## Always go straight down if possible.
+        if M[r + 1, c] == 0:
+            r = r + 1
+        ## Next try down/left.
+        elif c > 1 and M[r + 1, c - 1] == 0:
+            r = r + 1
+            c = c - 1
+        ## We've reached the edge of the screen
+        elif c == N - 1:
+            break
+        ## Next try down/right.
+        elif M[r + 1, c + 1] == 0:
+            r = r + 1
+            c = c + 1
+        ## Next try right.
+        elif M[r, c + 1] == 0:
+            c = c + 1
+        ## We're stuck
+        else:
+            break
+    return r == N - 1, r
+
+
+def droplets(M, rng, p, nrep):
+    ## The number of times that the bottom is reached and the total depth
+    ## across the simulation replications.
+    NB = 0
+    TD = 0
+    for i in range(nrep):
+        bottom, r = droplet(M, rng, p)
+        NB += bottom
+        TD += r
+    return NB, TD
+
+
+def simulation_lazy(p, N, nrep, rng=None, width=None):
+    ## Lets the droplet percolate down a strip N rows deep and 'width'
+    ## columns wide, N by default, laying out the rocks a row at a time.
+    if rng is None:
+        rng = np.random.default_rng()
+    # The two rows of the window, allocated once for every replication.
+    rows = np.empty((2, N if width is None else width), dtype=np.uint8)
+    NB, TD = descents(rows, rng, p, N, int(nrep))
+    return int(NB), int(TD)
+
+
+def fill(row, rng, p):
+    ## Randomly lay out the rocks of one row.
+    for b in range(row.size):
+        row[b] = rng.random() < p
+
+
+def descend(rows, rng, p, N):
+    ## Let the droplet percolate down a strip N rows deep, with rows[above]
+    ## holding the row it is on and rows[below] the row beneath, each laid
+    ## out when the droplet first reaches the row above it.  Returns the
+    ## final depth.
+    W = rows.shape[1]
+    above = 0
+    below = 1
+    fill(rows[above], rng, p)
+    if N > 1:
+        fill(rows[below], rng, p)
+
+    ## The initial position of the droplet.
+    r = 0
+    c = int(W / 2) - 1
+    while r < N - 1:
+        ## Always go straight down if possible.
+        if rows[below, c] == 0:
+            r = r + 1
+        ## Next try down/left.
+        elif c > 1 and rows[below, c - 1] == 0:
+            r = r + 1
+            c = c - 1
+        ## We've reached the edge of the screen
+        elif c == W - 1:
+            break
+        ## Next try down/right.
+        elif rows[below, c + 1] == 0:
+            r = r + 1
+            c = c + 1
+        ## Next try right.
+        elif rows[above, c + 1] == 0:
+            c = c + 1
+            continue
+        ## We're stuck
+        else:
+            break
+        ## The droplet has moved down, so the row beneath becomes the row it
+        ## is on and the row under that is laid out in place of the old one.
+        above, below = below, above
+        if r < N - 1:
+            fill(rows[below], rng, p)
+    return r
+
+
+def descents(rows, rng, p, N, nrep):
+    ## The number of times that the bottom is reached and the total depth
+    ## across the simulation replications of the lazy walk.
+    NB = 0
+    TD = 0
+    for i in range(nrep):
+        r = descend(rows, rng, p, N)
+        NB += r == N - 1
+        TD += r
+    return NB, TD
+
+
+def rock(M, r, c):
+    ## Whether the cell in row r and column c of a packed lattice holds rock.
+    return (int(M[r, c >> 6]) >> (c & 63)) & 1
+
+
+def simulation_packed(p, N, nrep, rng=None):
+    if rng is None:
+        rng = np.random.default_rng()
+
+    ## The total depth across the simulation replications.
+    TD = 0
+
+    ## The number of times that the bottom is reached.
+    NB = 0
+
+    ## Simulation replications.
+    for i in range(int(nrep)):
+        ## Randomly lay out the rocks, one bit per cell.
+        M = pack_lattice(p, N, N, rng)
+
+        ## The initial position of the droplet.
+        r = 0
+        c = int(N / 2) - 1
+        while r < N - 1:
+            ## Always go straight down if possible.
+            if not rock(M, r + 1, c):
+                r = r + 1
+            ## Next try down/left.
+            elif c > 1 and not rock(M, r + 1, c - 1):
+                r = r + 1
+                c = c - 1
+            ## We've reached the edge of the screen
+            elif c == N - 1:
+                break
+            ## Next try down/right.
+            elif not rock(M, r + 1, c + 1):
+                r = r + 1
+                c = c + 1
+            ## Next try right.
+            elif not rock(M, r, c + 1):
+                c = c + 1
+            ## We're stuck
+            else:
+                break
+
+        ## Keep track of how often we reach the bottom.
+        if r == N - 1:
+            NB = NB + 1
+
+        ## Keep track of the total of the final depths.
+        TD = TD + r
+    return NB, TD
+
+
+if njit is not None:
+    droplet = njit(droplet)
+    droplets = njit(droplets)
+    fill = njit(fill)
+    descend = njit(descend)
+    descents = njit(descents)
+else:
+    def fill(row, rng, p):
+        ## Randomly lay out the rocks of one row from raw random bits.
+        bernoulli(p, row, rng)
@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+"""
+Engines for the forest fire spreading outwards through trees and mud.
+"""
+## Each cell of an ny by nx forest holds mud with probability p and a tree
+## otherwise.  The fire starts at the centre and spreads to every tree
+## among the eight cells around a burning cell, so it burns the 8-connected
+## cluster of trees holding the centre.
+##
+## Every engine returns the number of times that the fire reaches any of
+## the four edges of the forest and the total number of cells burnt across
+## the replications, and draws from the numpy.random.Generator it is given.
+## The packed engine stops the fire as soon as it reaches an edge, so it
+## returns only the number of times that it does, and the Newman-Ziff engine
+## covers every density at once, see simulation_newman_ziff().
+import numpy as np
+
+from .lattice import batches, pack_lattice
+# numba and scipy are optional, without either the clusters are labelled by
+# the numpy union-find below
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+try:
+    from scipy import ndimage
+except ImportError:
+    ndimage = None
+
+# Version of the rules of the fire, to be raised whenever a change to an
+# engine alters its results so that cached results are no longer used
+version = 2
+
+
+def engine():
+    ## The name of the engine used by simulation().
+    if njit is not None:
+        return "compiled"
+    return "label" if ndimage is not None else "unionfind"
+
+
+def simulation(p, ny, nx, nrep, rng=None):
+    ## The fastest engine available: the compiled spread when numba is
+    ## installed, then scipy's labelling, then the numpy union-find.
+    if njit is not None:
+        return simulation_compiled(p, ny, nx, nrep, rng)
+    if ndimage is not None:
+        return simulation_label(p, ny, nx, nrep, rng=rng)
+    return simulation_unionfind(p, ny, nx, nrep, rng=rng)
+
+
+def forests(p, ny, nx, nrep, batch, rng):
+    ## Initialize the forest grids a stack at a time, limited to roughly
+    ## 'batch' cells, as masks of the cells which can burn: the trees, each
+    ## present with probability 1 - p, and the centre where the fire starts.
+    for X in batches(1 - p, (ny, nx), nrep, batch, rng):
+        X[:, ny//2, nx//2] = True
+        yield X
+
+
+def burning(roots, ny, nx):
+    ## The number of burning clusters in a stack of labelled forests which
+    ## touch an edge, and their total size, where the cells of a cluster
+    ## share a label that no mud cell is given.
+    n = roots.shape[0]
+    centre = roots[:, ny//2, nx//2]
+    edges = np.concatenate((roots[:, 0, :], roots[:, -1, :],
+                            roots[:, :, 0], roots[:, :, -1]), axis=1)
+    NB = int(np.count_nonzero((edges == centre[:, None]).any(axis=1)))
+    TS = int(np.count_nonzero(roots.reshape(n, -1) == centre[:, None]))
+    return NB, TS
+
+
+def simulation_label(p, ny, nx, nrep, batch=2**22, rng=None):
+    if rng is None:
+        rng = np.random.default_rng()
+    NB = TS = 0
+    # Neighbours are the eight cells around a cell within the same grid only.
+    structure = np.zeros((3, 3, 3), dtype=bool)
+    structure[1] = True
+    for X in forests(p, ny, nx, nrep, batch, rng):
+        labels = ndimage.label(X, structure=structure)[0]
+        reached, burnt = burning(labels, ny, nx)
+        NB, TS = NB + reached, TS + burnt
+    return NB, TS
+
+
+def simulation_unionfind(p, ny, nx, nrep, batch=2**20, rng=None):
+    if rng is None:
+        rng = np.random.default_rng()
+    NB = TS = 0
+    for X in forests(p, ny, nx, nrep, batch, rng):
+        reached, burnt = burning(label_clusters(X), ny, nx)
+        NB, TS = NB + reached, TS + burnt
+    return NB, TS
+
+
+def label_clusters(occupied):
+    """Label the 8-connected clusters of trees in a boolean mask of the
+    cells which can burn, of a grid or of a stack of grids, with a weighted
+    union-find.  Every tree or burning cell is given the flat index of the
+    root of its cluster and every mud cell is -1."""
+    ny, nx = occupied.shape[-2:]
+    index = np.arange(occupied.size).reshape(occupied.shape)
+
+    # Pairs of neighbouring trees, looking right, down, down-right and
+    # down-left so that each of the eight neighbours is paired exactly once.
+    a, b = [], []
+    for dy, dx in ((0, 1), (1, 0), (1, 1), (1, -1)):
+        src = (Ellipsis, slice(0, ny - dy), slice(max(0, -dx), nx - max(0, dx)))
+        dst = (Ellipsis, slice(dy, ny), slice(max(0, dx), nx - max(0, -dx)))
+        both = occupied[src] & occupied[dst]
+        a.append(index[src][both])
+        b.append(index[dst][both])
+    a, b = np.concatenate(a), np.concatenate(b)
+
+    ## The array-backed parent table, every cell starting as its own root.
+    parent = index.ravel().copy()
+    while True:
+        parent = compress(parent)
+        ra, rb = parent[a], parent[b]
+        # Pairs already in the same cluster stay there, so are dropped.
+        joined = ra != rb
+        if not joined.any():
+            break
+        a, b, ra, rb = a[joined], b[joined], ra[joined], rb[joined]
+        ## Hang the smaller cluster beneath the larger one, breaking ties on
+        ## the index so that no cycle can be formed within a pass.
+        weight = np.bincount(parent, minlength=parent.size)
+        lighter = (weight[ra] < weight[rb]) | ((weight[ra] == weight[rb]) & (ra < rb))
+        parent[np.where(lighter, ra, rb)] = np.where(lighter, rb, ra)
+    return np.where(occupied.ravel(), parent, -1).reshape(occupied.shape)
+
+
+def compress(parent):
+    ## Path compression: point every cell directly at the root of its cluster.
+    while True:
+        grandparent = parent[parent]
+        if (grandparent == parent).all():
+            return parent
+        parent = grandparent
+
+
+def simulation_compiled(p, ny, nx, nrep, rng=None):
+    if rng is None:
+        rng = np.random.default_rng()
+    # The grid and the queue of burning cells are allocated once and reused
+    # by the kernel for every replication.
+    X = np.empty((ny, nx), dtype=np.uint8)
+    queue = np.empty(ny * nx, dtype=np.int64)
+    NB, TS = fires(X, queue, rng, p, int(nrep))
+    return int(NB), int(TS)
+
+
+def burn(X, queue, rng, p):
+    ## Initialize the forest in the preallocated grid and burn it outwards
+    ## from the centre, one generation of the eight-cell neighbourhood at a
+    ## time.  Returns whether the fire reaches any edge of the forest and
+    ## the number of cells burnt.
+    ny, nx = X.shape
+    for y in range(ny):
+        for x in range(nx):
+            X[y, x] = rng.random() < p
+    # Starting position of fire at centre of grid
+    X[ny//2, nx//2] = 2
+    queue[0] = (ny//2) * nx + (nx//2)
+    head = 0
+    tail = 1
+    reached = False
+    while head < tail:
+        y = queue[head] // nx
+        x = queue[head] % nx
+        head += 1
+        ## Keep track of whether we reach the edges.
+        if y == 0 or y == ny - 1 or x == 0 or x == nx - 1:
+            reached = True
+        for dy in range(-1, 2):
+            for dx in range(-1, 2):
+                if 0 <= y + dy < ny and 0 <= x + dx < nx and X[y + dy, x + dx] == 0:
+                    X[y + dy, x + dx] = 2
+                    queue[tail] = (y + dy) * nx + (x + dx)
+                    tail += 1
+    return reached, tail
+
+
+def fires(X, queue, rng, p, nrep):
+    ## The number of times that the edge is reached and the total number of
+    ## cells burnt across the simulation replications.
+    NB = 0
+    TS = 0
+    for j in range(nrep):
+        reached, burnt = burn(X, queue, rng, p)
+        NB += reached
+        TS += burnt
+    return NB, TS
+
+
+if njit is not None:
+    burn = njit(burn)
+    fires = njit(fires)
+
+
+def spread(F):
+    ## Word-parallel spread of the fire in a packed lattice to the eight
+    ## neighbours of every burning cell, carrying bits across word boundaries.
+    one, top = np.uint64(1), np.uint64(63)
+    H = F | (F << one) | (F >> one)
+    H[:, 1:] |= F[:, :-1] >> top
+    H[:, :-1] |= F[:, 1:] << top
+    S = H.copy()
+    S[1:] |= H[:-1]
+    S[:-1] |= H[1:]
+    return S
+
+
+def simulation_packed(p, ny, nx, nrep, rng=None):
+    if rng is None:
+        rng = np.random.default_rng()
+
+    ## The number of times that the edge is reached.
+    NB = 0
+
+    words = (nx + 63) // 64
+    iy, ix = ny // 2, nx // 2
+    # Bits of the cells inside the forest, leaving out the padding of each row
+    inside = np.zeros(8 * words, dtype=np.uint8)
+    inside[:(nx + 7) // 8] = np.packbits(np.ones(nx, dtype=bool), bitorder='little')
+    inside = inside.view(np.uint64)
+    # Bits of the first and last columns of the forest
+    sides = np.zeros(8 * words, dtype=np.uint8)
+    column = np.zeros(nx, dtype=bool)
+    column[[0, -1]] = True
+    sides[:(nx + 7) // 8] = np.packbits(column, bitorder='little')
+    sides = sides.view(np.uint64)
+    ## Simulation replications.
+    for j in range(int(nrep)):
+        # Initialize the forest grid, one bit per cell set for mud.
+        X = pack_lattice(p, ny, nx, rng)
+        trees = ~X & inside
+        # Starting position of fire at centre of grid
+        F = np.zeros_like(X)
+        F[iy, ix >> 6] = np.uint64(1) << np.uint64(ix & 63)
+        trees[iy, ix >> 6] |= F[iy, ix >> 6]
+        # Only the rows the fire has reached, plus one either side, are spread.
+        lo, hi = iy, iy + 1
+        while True:
+            ## Keep track of how often we reach the edges.
+            if lo == 0 or hi == ny or (F[lo:hi] & sides).any():
+                NB += 1
+                break
+            lo, hi = max(lo - 1, 0), min(hi + 1, ny)
+            burning = spread(F[lo:hi]) & trees[lo:hi]
+            ## The fire has stopped spreading.
+            if (burning == F[lo:hi]).all():
+                break
+            F[lo:hi] = burning
+            while not F[lo].any():
+                lo += 1
+            while not F[hi - 1].any():
+                hi -= 1
+    return NB
+
+
+def simulation_newman_ziff(ny, nx, nrep, rng=None):
+    """Plant the trees of each replication one at a time in a random order
+    (Newman-Ziff), joining neighbouring trees with a weighted union-find.
+    Returns, for each replication, the number of trees planted when the
+    cluster burning at the centre first reaches an edge of the forest, from
+    which crossing_number() gives the crossings at any density."""
+    if rng is None:
+        rng = np.random.default_rng()
+    cells = ny * nx
+    centre = (ny//2) * nx + (nx//2)
+    # Flat indices of the eight nearest neighbours of every cell in the forest
+    neighbours = []
+    for y in range(ny):
+        for x in range(nx):
+            neighbours.append([(y + dy) * nx + (x + dx)
+                               for dy in (-1, 0, 1) for dx in (-1, 0, 1)
+                               if (dy or dx) and 0 <= y + dy < ny and 0 <= x + dx < nx])
+    # Cells lying on any of the four edges of the forest
+    edge = [y in (0, ny - 1) or x in (0, nx - 1)
+            for y in range(ny) for x in range(nx)]
+
+    def find(i):
+        ## Path halving, pointing every other cell at its grandparent.
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    first = np.zeros(int(nrep), dtype=np.int64)
+    ## Simulation replications.
+    for j in range(int(nrep)):
+        parent = list(range(cells))
+        size = [1] * cells
+        reached = list(edge)
+        # The centre is always alight, whether or not it holds a tree.
+        planted = [False] * cells
+        planted[centre] = True
+        if reached[centre]:
+            continue
+        # Every cell other than the centre, in the order its tree is planted
+        order = rng.permutation(cells - 1)
+        order[order >= centre] += 1
+        for n, i in enumerate(order.tolist(), 1):
+            planted[i] = True
+            root = i
+            for k in neighbours[i]:
+                if planted[k]:
+                    other = find(k)
+                    if other != root:
+                        ## Hang the smaller cluster beneath the larger one.
+                        if size[root] < size[other]:
+                            root, other = other, root
+                        parent[other] = root
+                        size[root] += size[other]
+                        reached[root] = reached[root] or reached[other]
+            if reached[find(centre)]:
+                first[j] = n
+                break
+    return first
+
+
+def crossing_number(first, p, ny, nx):
+    ## The expected number of replications in which the edge is reached at a
+    ## density p of mud, averaging over the binomially distributed number of
+    ## trees planted in the cells other than the centre.
+    m = ny * nx - 1
+    n = np.arange(m + 1)
+    if p >= 1:
+        weight = 1.0 * (n == 0)
+    elif p <= 0:
+        weight = 1.0 * (n == m)
+    else:
+        log = np.concatenate(([0.0], np.cumsum(np.log((m - n[:-1]) / (n[:-1] + 1)))))
+        log += n * np.log(1 - p) + (m - n) * np.log(p)
+        weight = np.exp(log - log.max())
+        weight /= weight.sum()
+    # Number of replications which have reached the edge after n trees
+    reached = np.cumsum(np.bincount(first, minlength=m + 1))
+    return float(np.dot(weight, reached))
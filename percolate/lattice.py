@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Random lattices of cells occupied independently with probability p.
+"""
+## The cells are drawn from the raw bits of the generator rather than from
+## floats: each cell takes 8 or 16 random bits, compared as an unsigned
+## integer against p scaled to that many bits.  Where p is not a multiple
+## of 2**-16 the cells falling exactly on the threshold, one in 65536, are
+## settled by a further draw, so every cell is occupied with probability
+## exactly p.  The lattice is written in place into a buffer which can be
+## reused for every replication.
+import numpy as np
+
+
+def bits(p):
+    ## The number of random bits each cell needs, 8 when p is a multiple of
+    ## 1/256 and 16 otherwise.
+    return 8 if (p * 256) % 1 == 0 else 16
+
+
+def bernoulli(p, out, rng):
+    """Fill the boolean or uint8 array 'out' in place with cells which are
+    1 with probability p, drawing from the numpy.random.Generator 'rng'.
+    'out' may have any shape, so a stack of grids is filled at once.
+    Returns 'out'."""
+    flat = out.reshape(-1).view(bool)
+    if p <= 0 or p >= 1:
+        flat[:] = p >= 1
+        return out
+    n = flat.size
+    b = bits(p)
+    dtype = np.uint8 if b == 8 else np.uint16
+    # whole 64-bit words from the bit generator, viewed as 8 or 16 bit cells
+    raw = rng.bit_generator.random_raw(-(-n * b // 64)).view(dtype)[:n]
+    scaled = p * 2**b
+    k = int(scaled)
+    np.less(raw, k, out=flat)
+    if scaled > k:
+        ties = np.flatnonzero(raw == k)
+        flat[ties] = rng.random(len(ties)) < scaled - k
+    return out
+
+
+def lattice(p, shape, rng, out=None):
+    ## A boolean lattice of the given shape, or of the shape of 'out' when
+    ## a buffer to reuse is given.
+    if out is None:
+        out = np.empty(shape, dtype=bool)
+    return bernoulli(p, out, rng)
+
+
+def batches(p, shape, nrep, batch, rng):
+    """Yield nrep lattices of the given shape in stacks of roughly 'batch'
+    cells, reusing one buffer for every stack, so that only the last stack
+    can be shorter.  A stack must be used before the next one is drawn."""
+    cells = int(np.prod(shape))
+    nrep = int(nrep)
+    size = max(1, min(nrep, batch // cells))
+    buffer = np.empty((size,) + tuple(shape), dtype=bool)
+    done = 0
+    while done < nrep:
+        n = min(size, nrep - done)
+        yield bernoulli(p, buffer[:n], rng)
+        done += n
+
+
+def pack_lattice(p, ny, nx, rng, batch=2**22):
+    """An ny by nx lattice packed one bit per cell in rows of uint64 words,
+    where bit x % 64 of word x // 64 is set when column x is occupied.  The
+    lattice is laid out a block of rows at a time so that it is never held a
+    byte per cell."""
+    words = (nx + 63) // 64
+    M = np.zeros((ny, words), dtype=np.uint64)
+    rows = max(1, min(ny, batch // nx))
+    block = np.empty((rows, nx), dtype=bool)
+    padded = np.zeros((rows, 8 * words), dtype=np.uint8)
+    for y in range(0, ny, rows):
+        n = min(rows, ny - y)
+        packed = np.packbits(bernoulli(p, block[:n], rng), axis=1, bitorder='little')
+        padded[:n, :packed.shape[1]] = packed
+        M[y:y + n] = padded[:n].view(np.uint64)
+    return M
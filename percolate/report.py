@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+Tables, plots and workbooks made from the results of a sweep.
+"""
+## pandas, openpyxl, matplotlib and seaborn take over a second to import
+## and matplotlib wants a display, so they are imported by tables() and
+## plotting() when first needed, and a sweep with no plots or workbooks
+## never imports matplotlib.
+import os
+import numpy as np
+
+from .sweep import densities
+
+pd = None
+plt = sns = None
+
+# Column names and axis labels of each model
+columns = {"droplet": ["Density", "Number_Bottom", "Frequency_Reach_Bottom",
+                       "Total_Depth", "Average_Depth"],
+           "forest": ["Density", "Number_Edge", "Frequency_Reach_Edge",
+                      "Total_Burnt", "Average_Burnt"]}
+titles = {"droplet": "Water Percolation", "forest": "Forest Fire Percolation"}
+xlabels = {"droplet": "Density of rocks in the sand",
+           "forest": "Density of mud in the forest"}
+ylabels = {"droplet": "Expectation that the bottom is reached",
+           "forest": "Expectation that the edge is reached"}
+# Name of each model in the results store, shared with the parameter scripts
+stores = {"droplet": "percolation", "forest": "forest"}
+palette = ['green', 'orange', 'purple', 'dodgerblue', 'red',
+           'Burlywood', 'DarkSlateGray', 'SaddleBrown', 'Teal', 'Olive']
+
+
+def tables():
+    ## Imports pandas the first time a data frame is needed.
+    global pd
+    if pd is None:
+        import pandas as pd
+        # ensure data frame is not truncated
+        pd.set_option('display.max_columns', None)
+        pd.set_option('display.max_rows', None)
+
+
+def plotting():
+    ## Imports matplotlib and seaborn the first time anything is plotted.
+    global plt, sns
+    if plt is None:
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+
+
+def block(results, sweep, N, nrep):
+    ## The results of one grid size and number of realisations of a sweep,
+    ## one row for each density.
+    tables()
+    model = sweep["model"]
+    rows = []
+    for p in densities(sweep["start"], sweep["stop"], sweep["step"]):
+        NB, TD = results[(model, N, nrep, p)]
+        rows.append([p, NB, NB / nrep, TD, TD / nrep])
+    return pd.DataFrame(rows, columns=columns[model])
+
+
+def critical(df):
+    ## The highest density at which the bottom or edge is ever reached,
+    ## or nan when it never is.
+    reached = df[df.iloc[:, 1] >= 1]
+    return reached["Density"].max() if len(reached) else np.nan
+
+
+def report(results, sweep):
+    """Print the table of every grid size and number of realisations of a
+    sweep with its critical density, then make the plots and workbook the
+    sweep asks for and store the tables in the results store."""
+    tables()
+    model = sweep["model"]
+    blocks = {}
+    pc = pd.DataFrame(columns=["Grid Size", "Realisations", "Crit_Perc"])
+    for N in sweep["sizes"]:
+        for i in sweep["realisations"]:
+            i = round(i)
+            df = block(results, sweep, N, i)
+            blocks[(N, i)] = df
+            pc.loc[len(pc)] = [N, i, critical(df)]
+            print("\n" + sweep["name"] + ": " + str(i) + " realisations on a "
+                  + str(N) + "x" + str(N) + " grid")
+            print(df)
+            if sweep["store"]:
+                save_results(df, stores[model], N, i)
+    pc = pc.astype({"Grid Size": np.int64, "Realisations": np.int64})
+    print("\n" + sweep["name"] + ": critical densities")
+    print(pc)
+    if sweep["excel"]:
+        write_excel(sweep["excel"], blocks, pc)
+    plots = sweep["plot"] or []
+    for kind in [plots] if isinstance(plots, str) else plots:
+        if kind == "blocks":
+            plot_blocks(sweep, blocks)
+        elif kind == "sizes":
+            plot_sizes(sweep, blocks)
+        elif kind == "critical":
+            plot_critical(sweep, pc)
+    return blocks, pc
+
+
+def write_excel(excel_file, blocks, pc):
+    ## Writes a sheet for each grid size and number of realisations, in the
+    ## layout of the Trials workbooks, and a sheet of the critical densities.
+    tables()
+    try:
+        with pd.ExcelWriter(excel_file, engine='openpyxl') as writer:
+            for (N, i), df in blocks.items():
+                sheetName = str(i) + 'realisations' + str(N) + "by" + str(N)
+                df.to_excel(writer, sheet_name=sheetName, index=False, header=True)
+            pc.to_excel(writer, sheet_name="Critical Percolations", index=False,
+                        header=True)
+        print("Created the excel file " + str(excel_file))
+    except PermissionError:
+        print("Please ensure the file '" + str(excel_file) + "' is not open in another program")
+
+
+def axes(sweep):
+    ## Limits and ticks of the density axis covering the sweep.
+    low, high = sorted((sweep["start"], sweep["stop"]))
+    if high - low >= 0.5:
+        low, high, tick = 0, 1, 0.1
+    else:
+        tick = round((high - low) / 10, 10)
+    plt.xlim(low, high)
+    plt.xticks(np.arange(low, high + tick / 2, step=tick))
+
+
+def plot_blocks(sweep, blocks):
+    ## A scatter plot of the frequency against density for each grid size
+    ## and number of realisations.
+    plotting()
+    model = sweep["model"]
+    for (N, i), df in blocks.items():
+        df.plot(x='Density', y=columns[model][2], kind='scatter')
+        plt.title(titles[model] + " - " + str(i) + " Realisations - "
+                  + str(N) + "x" + str(N) + " Grid")
+        axes(sweep)
+        plt.ylim(0, 1)
+        plt.xlabel(xlabels[model])
+        plt.ylabel(ylabels[model])
+        plt.yticks(np.arange(0, 1.1, step=0.1))
+        plt.show()
+
+
+def plot_sizes(sweep, blocks):
+    ## The frequency against density of every grid size, one plot for each
+    ## number of realisations.
+    plotting()
+    model = sweep["model"]
+    for i in sweep["realisations"]:
+        i = round(i)
+        frames = [df.assign(**{"Grid Size": N}) for (N, n), df in blocks.items() if n == i]
+        pc = pd.concat(frames, ignore_index=True)
+        # Use the 'hue' argument to provide a factor variable
+        sns.scatterplot(data=pc, x="Density", y=columns[model][2], hue='Grid Size',
+                        legend='full', palette=palette[:len(frames)])
+        plt.title(titles[model] + " for different size grids\n" + str(i) + " realisations")
+        axes(sweep)
+        plt.ylim(0, 1)
+        plt.xlabel(xlabels[model])
+        plt.ylabel(ylabels[model])
+        plt.legend(loc='upper right')
+        plt.yticks(np.arange(0, 1+0.1, step=0.1))
+        plt.show()
+
+
+def plot_critical(sweep, pc):
+    ## The critical density against the number of realisations, coloured
+    ## by grid size.
+    plotting()
+    top = max(round(i) for i in sweep["realisations"])
+    sns.scatterplot(data=pc, x="Crit_Perc", y="Realisations", hue='Grid Size',
+                    legend='full', palette=palette[:len(sweep["sizes"])])
+    plt.title("Critical Percolation against Number of Realisations")
+    axes(sweep)
+    plt.ylim(0, top)
+    plt.xlabel('Critical Percolation')
+    plt.ylabel('Number of Realisations')
+    plt.legend(loc='upper left')
+    plt.yticks(np.arange(0, top+0.1, step=top/10))
+    plt.show()
+
+
+def save_results(df, model, n, nrep, store="results"):
+    ## Writes the results for one grid size and number of realisations to
+    ## their own partition of the results store, replacing any earlier run.
+    folder = os.path.join(store, "model=" + model, "size=" + str(n),
+                          "realisations=" + str(nrep))
+    os.makedirs(folder, exist_ok=True)
+    df = df.infer_objects()
+    # Parquet needs pyarrow or fastparquet, otherwise the rows are kept as csv
+    try:
+        df.to_parquet(os.path.join(folder, "part-0.parquet"), index=False)
+    except ImportError:
+        df.to_csv(os.path.join(folder, "part-0.csv"), index=False)
+
+
+def load_results(model, n, nrep, store="results"):
+    ## The results for one grid size and number of realisations kept in the
+    ## results store.
+    tables()
+    folder = os.path.join(store, "model=" + model, "size=" + str(n),
+                          "realisations=" + str(nrep))
+    if os.path.exists(os.path.join(folder, "part-0.parquet")):
+        return pd.read_parquet(os.path.join(folder, "part-0.parquet"))
+    return pd.read_csv(os.path.join(folder, "part-0.csv"))
+
+
+def export_xlsx(model, folder=None, store="results", force=False):
+    ## Writes the stored results in the layout of the Trials workbooks, one
+    ## workbook for each grid size with a sheet for each number of realisations.
+    ## They go in the untracked 'workbooks' folder of the store unless another
+    ## is given, and a workbook already there is only overwritten when 'force'
+    ## is set, so that the published Raw Datasets are never written over by
+    ## accident.
+    tables()
+    if folder is None:
+        folder = os.path.join(store, "workbooks")
+    os.makedirs(folder, exist_ok=True)
+    root = os.path.join(store, "model=" + model)
+    sizes = sorted(int(name.split("=")[1]) for name in os.listdir(root))
+    for n in sizes:
+        excel_file = os.path.join(folder, "Trials_" + model + str(n) + ".xlsx")
+        if os.path.exists(excel_file) and not force:
+            print("Skipped the excel file " + str(excel_file) +
+                  " as it already exists, export with force to overwrite it")
+            continue
+        parts = os.listdir(os.path.join(root, "size=" + str(n)))
+        nrep = sorted(int(name.split("=")[1]) for name in parts)
+        try:
+            with pd.ExcelWriter(excel_file, engine='openpyxl') as writer:
+                for i in nrep:
+                    sheetName = str(i) + 'realisations' + str(n) + "by" + str(n)
+                    load_results(model, n, i, store).to_excel(writer, sheet_name=sheetName,
+                                                              index=False, header=True)
+            print("Created the excel file " + str(excel_file))
+        except PermissionError:
+            print("Please ensure the file '" + str(excel_file) +
+                  "' is not open in another program")
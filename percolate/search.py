@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Searches for the critical density and early stopping of the replications.
+"""
+## Both models are searched the same way: a function running n replications
+## at a density and returning how many reached the bottom, or the edge, is
+## all the search needs, whichever engine runs them.
+import numpy as np
+
+
+def critical_density(crossings, level=0.5, nrep=4000, batch=20, p=0.5, gain=0.25, z=1.96):
+    """Robbins-Monro search for the density at which the frequency with which
+    the bottom, or edge, is reached equals 'level'.  crossings(p, n) runs n
+    replications at density p and returns how many reached it.  Returns the
+    estimate and the half-width of its confidence interval, from a logistic
+    fit with binomial errors to every batch run by the search."""
+    tried = []
+    reached = []
+    iterates = []
+    for k in range(1, max(2, int(nrep) // batch) + 1):
+        NB = crossings(p, batch)
+        tried.append(p)
+        reached.append(NB)
+        ## Getting through is less likely the denser the rock or mud, so
+        ## getting through more often than 'level' moves the estimate up,
+        ## and otherwise down.
+        p = min(1.0, max(0.0, p + gain * k ** -0.7 * (NB / batch - level)))
+        iterates.append(p)
+    ## The iterates follow one another, so their spread says little about
+    ## the error of their average.  The batches themselves are independent
+    ## binomial counts, so the crossing frequency is fitted to all of them,
+    ## the batches far from the target counting for little, and the interval
+    ## is that of the density where the fit equals 'level'.
+    fit = logistic_fit(np.array(tried), np.array(reached), batch, level)
+    if fit is None:
+        # the fit failed, e.g. every batch got through: the Polyak average
+        return float(np.mean(iterates[len(iterates) // 2:])), np.nan
+    estimate, se = fit
+    return estimate, float(z * se)
+
+
+def logistic_fit(x, successes, n, level, steps=50):
+    ## Maximum likelihood fit of log(P / (1 - P)) = a + b (x - x0) to the
+    ## counts of successes out of n at each x, by iteratively reweighted least
+    ## squares.  Returns the x at which P equals 'level' and its standard
+    ## error by the delta method, or None when the fit does not converge or
+    ## has no slope.
+    x0 = x.mean()
+    X = np.column_stack((np.ones(len(x)), x - x0))
+    beta = np.zeros(2)
+    for i in range(steps):
+        P = 1 / (1 + np.exp(-X @ beta))
+        W = n * P * (1 - P)
+        information = X.T @ (W[:, None] * X)
+        try:
+            change = np.linalg.solve(information, X.T @ (successes - n * P))
+        except np.linalg.LinAlgError:
+            return None
+        beta = beta + change
+        if np.abs(change).max() < 1e-10:
+            break
+    else:
+        return None
+    a, b = beta
+    if not np.isfinite(b) or b == 0:
+        return None
+    P = 1 / (1 + np.exp(-X @ beta))
+    covariance = np.linalg.inv(X.T @ ((n * P * (1 - P))[:, None] * X))
+    L = np.log(level / (1 - level))
+    ## x = x0 + (L - a) / b, with gradient (-1 / b, -(L - a) / b**2).
+    gradient = np.array([-1 / b, -(L - a) / b ** 2])
+    return float(x0 + (L - a) / b), float(np.sqrt(gradient @ covariance @ gradient))
+
+
+def sequential(simulation, nrep, width=0.02, tol=0.01, block=50, z=1.96, least=10):
+    ## Runs the replications a block at a time, simulation(m) running m of
+    ## them and returning the number of times that the bottom, or edge, is
+    ## reached and the total depth or number of cells burnt, stopping early
+    ## once the Wilson interval on the frequency is narrower than 'width' and
+    ## it has been reached, and missed, at least 'least' times each, or once
+    ## the interval lies within 'tol' of 1.  A density at which it is never
+    ## reached runs every one of the nrep replications, so the first density
+    ## at which it is reached at all, the critical percolation of the scripts,
+    ## is found just as often as without stopping.  Returns the number of
+    ## times that it is reached, the total and the number of replications
+    ## actually used.
+    NB, TD, n = 0, 0, 0
+    while n < int(nrep):
+        m = min(block, int(nrep) - n)
+        sim = simulation(m)
+        NB, TD, n = NB + sim[0], TD + sim[1], n + m
+        lower, upper = wilson(NB, n, z)
+        if upper - lower < width and min(NB, n - NB) >= least or lower >= 1 - tol:
+            break
+    return NB, TD, n
+
+
+def wilson(NB, n, z=1.96):
+    ## The Wilson score interval for the frequency NB / n.
+    centre = (NB + z * z / 2) / (n + z * z)
+    half = z * np.sqrt(NB * (n - NB) / n + z * z / 4) / (n + z * z)
+    return centre - half, centre + half
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""
+Long-lived server running sweeps on warm engines.
+"""
+## Every invocation of the command line pays for starting python, importing
+## numpy and compiling the numba kernels before a single cell is run.  The
+## server pays for these once: it keeps a pool of worker processes whose
+## engines are compiled when they start, and answers any number of sweeps
+## over a Unix socket, or a localhost port, e.g.
+##
+##     python -m percolate.server --address percolate.sock
+##
+## A sweep is sent as one line of JSON with the names of a sweep in a config
+## file, "model", "sizes", "realisations" (or "nrep"), "start", "stop" and
+## "step", and optionally "seed".  One line of JSON is sent back for each
+## cell as soon as it is finished, with the model, size, realisations and
+## the columns of its table, then a last line holding "done".  Cells are
+## only ever run once for a seed, those already run by the server or in the
+## cache are sent straight back, and a sweep without a seed uses the seed
+## the server was started with.  From python,
+##
+##     for row in query({"model": "droplet", "sizes": [50], "nrep": 1000}):
+##         print(row)
+import os
+import json
+import time
+import socket
+import asyncio
+import argparse
+import numpy as np
+from multiprocessing import Pool
+
+from . import droplet, forest, cache
+from .sweep import cells, run_cell, stream, defaults, models
+from .report import columns
+
+
+def warm():
+    ## Runs each engine once on a tiny grid when a worker starts, so that
+    ## the numba kernels are compiled before the first sweep arrives.
+    rng = np.random.default_rng(0)
+    droplet.simulation(0.5, 4, 1, rng)
+    forest.simulation(0.5, 4, 4, 1, rng)
+
+
+def parse(line):
+    ## The sweep of a request line, with the settings not given taken from
+    ## the defaults.  Raises ValueError for a request which is not a sweep.
+    request = json.loads(line)
+    if not isinstance(request, dict) or request.get("model") not in models:
+        raise ValueError("a sweep needs a model, one of " + ", ".join(models))
+    if "nrep" in request:
+        request["realisations"] = request.pop("nrep")
+    for k in ("sizes", "realisations"):
+        if k in request and not isinstance(request[k], list):
+            request[k] = [request[k]]
+    sweep = dict(defaults, **request)
+    for k in ("sizes", "realisations"):
+        if not sweep[k] or not all(number(v) and v >= 1 for v in sweep[k]):
+            raise ValueError(k + " must be a list of numbers of at least 1")
+    for k in ("sizes", "realisations"):
+        if not all(float(v).is_integer() for v in sweep[k]):
+            raise ValueError(k + " must be whole numbers")
+        sweep[k] = [int(v) for v in sweep[k]]
+    for k in ("start", "stop", "step"):
+        if not number(sweep[k]):
+            raise ValueError(k + " must be a number")
+    if sweep["step"] <= 0:
+        raise ValueError("the step must be positive")
+    if sweep.get("seed") is not None and not (isinstance(sweep["seed"], int)
+                                              and sweep["seed"] >= 0):
+        raise ValueError("the seed must be a whole number of at least 0")
+    return sweep
+
+
+def number(value):
+    ## Whether a value of a request is a finite number, and not a boolean.
+    return (isinstance(value, (int, float)) and not isinstance(value, bool)
+            and np.isfinite(value))
+
+
+def row(cell, result):
+    ## The line sent back for a finished cell, with the columns of its table.
+    model, N, nrep, p = cell
+    NB, TD = result
+    values = [p, NB, NB / nrep, TD, TD / nrep]
+    return dict({"model": model, "size": N, "realisations": nrep},
+                **dict(zip(columns[model], values)))
+
+
+class Server:
+    """The pool of warm workers and the results of every cell run so far,
+    each a future keyed by the cell and the entropy of its stream, shared by
+    every connection so that a cell asked for twice is only run once.  Only
+    the 'keep' results used most recently are kept, those older being read
+    back from the cache when it is on, or run again."""
+
+    def __init__(self, workers=None, seed=None, folder=None, limit=100 * 2**20,
+                 keep=10**5):
+        self.pool = Pool(workers or os.cpu_count(), initializer=warm)
+        self.entropy = np.random.SeedSequence(seed).entropy
+        # the results of the server's own entropy are only worth caching
+        # when it was given as a seed, and so can be given again
+        self.seeded = seed is not None
+        self.folder = folder
+        self.limit = limit
+        self.keep = keep
+        self.results = {}
+
+    def submit(self, cell, entropy):
+        ## The future of a cell's results, run on the pool unless it has
+        ## already been run or is in the cache.
+        loop = asyncio.get_running_loop()
+        future = self.results.pop((cell, entropy), None)
+        if future is not None:
+            # moved to the end, as the result used most recently
+            self.results[(cell, entropy)] = future
+            return future, True
+        self.forget()
+        future = loop.create_future()
+        self.results[(cell, entropy)] = future
+        cached = cache.load(self.folder, cell, entropy) if self.folder else None
+        if cached is not None:
+            future.set_result(tuple(cached))
+            return future, True
+
+        def finished(result):
+            if self.folder and (self.seeded or entropy != self.entropy):
+                cache.save(self.folder, cell, entropy, result[1])
+            future.set_result(result[1])
+
+        def failed(error):
+            # a failed cell is run again when next asked for
+            self.results.pop((cell, entropy), None)
+            future.set_exception(error)
+
+        self.pool.apply_async(run_cell, ((cell, stream(cell, entropy)),),
+                              callback=lambda r: loop.call_soon_threadsafe(finished, r),
+                              error_callback=lambda e: loop.call_soon_threadsafe(failed, e))
+        return future, False
+
+    def forget(self):
+        ## Drops the finished results used longest ago once more than 'keep'
+        ## are held.  Results still running are kept for those waiting.
+        if len(self.results) < self.keep:
+            return
+        for key in [key for key, future in self.results.items() if future.done()]:
+            del self.results[key]
+            if len(self.results) < self.keep // 2:
+                break
+
+    async def sweep(self, sweep, writer):
+        ## Runs the cells of one sweep, writing each as it is finished.
+        start = time.perf_counter()
+        entropy = sweep.get("seed")
+        entropy = self.entropy if entropy is None else entropy
+        wanted = sorted(set(cells(sweep)), key=lambda cell: cell[1] * cell[1] * cell[2],
+                        reverse=True)
+        futures = {}
+        ready = 0
+        for cell in wanted:
+            future, done = self.submit(cell, entropy)
+            futures[future] = cell
+            ready += done
+        pending = set(futures)
+        while pending:
+            finished, pending = await asyncio.wait(pending,
+                                                   return_when=asyncio.FIRST_COMPLETED)
+            for future in finished:
+                if future.exception() is not None:
+                    line = {"error": repr(future.exception()), "cell": futures[future]}
+                else:
+                    line = row(futures[future], future.result())
+                writer.write((json.dumps(line) + "\n").encode())
+            await writer.drain()
+        writer.write((json.dumps({"done": len(wanted), "ready": ready, "entropy": entropy,
+                                  "seconds": time.perf_counter() - start}) + "\n").encode())
+        await writer.drain()
+        if self.folder and ready < len(wanted):
+            await asyncio.get_running_loop().run_in_executor(None, cache.evict,
+                                                             self.folder, self.limit)
+
+    async def handle(self, reader, writer):
+        ## Answers the sweeps sent over one connection, one line each, in turn.
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    sweep = parse(line)
+                except (ValueError, TypeError) as error:
+                    writer.write((json.dumps({"error": str(error)}) + "\n").encode())
+                    await writer.drain()
+                    continue
+                try:
+                    await self.sweep(sweep, writer)
+                except ConnectionError:
+                    raise
+                except Exception as error:
+                    # the client is told rather than left with a closed connection
+                    writer.write((json.dumps({"error": repr(error)}) + "\n").encode())
+                    await writer.drain()
+        except ConnectionError:
+            # the client went away, its cells are kept for the next one
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, address):
+        ## Listens on a Unix socket, or on a localhost port when the address
+        ## is a port or host:port, until interrupted.
+        host, port = split(address)
+        if port is None:
+            if os.path.exists(address):
+                os.remove(address)
+            server = await asyncio.start_unix_server(self.handle, path=address)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        print("Serving sweeps on " + address)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if port is None and os.path.exists(address):
+                os.remove(address)
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+
+def split(address):
+    ## The host and port of a TCP address, or None for the port of a path.
+    host, _, port = str(address).rpartition(":")
+    if port.isdigit():
+        return host or "127.0.0.1", int(port)
+    return None, None
+
+
+def query(sweep, address="percolate.sock"):
+    """Send one sweep to a running server and yield the row of each cell as
+    it is finished, then the last line holding "done".  Raises
+    RuntimeError when the server refuses the sweep."""
+    host, port = split(address)
+    if port is None:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(address)
+    else:
+        connection = socket.create_connection((host, port))
+    with connection, connection.makefile("rwb") as stream:
+        stream.write((json.dumps(sweep) + "\n").encode())
+        stream.flush()
+        for line in stream:
+            line = json.loads(line)
+            if "error" in line and "cell" not in line:
+                raise RuntimeError(line["error"])
+            yield line
+            if "done" in line:
+                break
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m percolate.server",
+                                     description="Serve sweeps of the droplet and forest "
+                                                 "fire models on warm engines.")
+    parser.add_argument("--address", default="percolate.sock",
+                        help="Unix socket path, or localhost port or host:port")
+    parser.add_argument("--workers", type=int, help="processes, default every core")
+    parser.add_argument("--seed", type=int, help="seed of sweeps which give none")
+    parser.add_argument("--cache", default="cache",
+                        help="folder caching the results of cells, 'none' for no cache")
+    parser.add_argument("--cache-size", type=float, default=100,
+                        help="megabytes the cache is kept within, default 100")
+    parser.add_argument("--keep", type=int, default=10**5,
+                        help="results kept in memory, default 100000")
+    args = parser.parse_args(argv)
+    server = Server(args.workers, args.seed, None if args.cache == "none" else args.cache,
+                    int(args.cache_size * 2**20), args.keep)
+    try:
+        asyncio.run(server.serve(args.address))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    main()
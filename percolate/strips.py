@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+Clusters of trees on long strips of forest, labelled a row at a time.
+"""
+## The Hoshen-Kopelman labelling of the forest is made a row at a time as
+## the row is laid out.  Each tree takes the label of the trees among its
+## neighbours in the row above and to its left, joining their clusters in
+## an equivalence table when they differ, or starts a cluster of its own.
+## Once a row is labelled the clusters with no tree in it are finished and
+## counted, and the clusters still growing are given the labels 1, 2, ...
+## afresh, so only the label row and a table of about 'width' labels are
+## ever kept however long the strip is, e.g.
+##
+##     python -m percolate.strips --densities 0.4 0.45 --width 1000 --length 1e7
+##
+## The forest spans the strip when one cluster holds trees in both its top
+## and bottom rows.
+import os
+import argparse
+import numpy as np
+from multiprocessing import Pool
+
+from .droplet import njit
+
+# Number of bins of the cluster sizes, bin b counting sizes from 2**(b-1) up
+# to 2**b - 1
+bins = 64
+
+
+def find(parent, a):
+    ## The root of label a, halving the path on the way.
+    while parent[a] != a:
+        parent[a] = parent[parent[a]]
+        a = parent[a]
+    return a
+
+
+def strip(q, width, length, rng, counts):
+    """Lay out and label a forest 'width' trees wide and 'length' rows long
+    where each cell holds a tree with probability q, adding the size of each
+    cluster to its bin of 'counts'.  Returns whether the strip is spanned
+    from top to bottom, the number of clusters, the size of the largest and
+    the sum of the sizes and of their squares."""
+    prev = np.zeros(width, dtype=np.int64)
+    cur = np.zeros(width, dtype=np.int64)
+    # The equivalence table, with the size of each cluster and whether it
+    # holds a tree in the top row, kept at its root
+    parent = np.arange(width + 2, dtype=np.int64)
+    size = np.zeros(width + 2, dtype=np.int64)
+    top = np.zeros(width + 2, dtype=np.bool_)
+    relabel = np.zeros(width + 2, dtype=np.int64)
+    spans = False
+    clusters = 0
+    largest = 0
+    total = 0
+    squares = 0.0
+    # Labels 1 to k are the clusters still growing from the row above.
+    k = 0
+    for y in range(length):
+        n = k
+        for x in range(width):
+            cur[x] = 0
+            if rng.random() >= q:
+                continue
+            label = 0
+            if x > 0 and cur[x - 1] != 0:
+                label = find(parent, cur[x - 1])
+            for dx in range(-1, 2):
+                if 0 <= x + dx < width and prev[x + dx] != 0:
+                    other = find(parent, prev[x + dx])
+                    if label == 0:
+                        label = other
+                    elif other != label:
+                        ## Join the two clusters under the smaller label.
+                        if other < label:
+                            label, other = other, label
+                        parent[other] = label
+                        size[label] += size[other]
+                        top[label] = top[label] or top[other]
+            if label == 0:
+                ## Start a cluster of its own.
+                n += 1
+                label = n
+                parent[n] = n
+                size[n] = 0
+                top[n] = y == 0
+            cur[x] = label
+            size[label] += 1
+        ## Mark the clusters with a tree in this row by their root.
+        for a in range(1, n + 1):
+            relabel[a] = 0
+        for x in range(width):
+            if cur[x] != 0:
+                cur[x] = find(parent, cur[x])
+                relabel[cur[x]] = -1
+        last = y == length - 1
+        j = 0
+        for a in range(1, n + 1):
+            if parent[a] != a:
+                continue
+            if relabel[a] == 0 or last:
+                ## The cluster is finished, in the bottom row when it is last.
+                if last and relabel[a] != 0 and top[a]:
+                    spans = True
+                clusters += 1
+                largest = max(largest, size[a])
+                total += size[a]
+                squares += float(size[a]) * size[a]
+                b = 0
+                s = size[a]
+                while s > 0:
+                    b += 1
+                    s >>= 1
+                counts[min(b, counts.size - 1)] += 1
+            else:
+                ## The cluster carries on into the next row as label j.
+                j += 1
+                relabel[a] = j
+                parent[j] = j
+                size[j] = size[a]
+                top[j] = top[a]
+        for x in range(width):
+            if cur[x] != 0:
+                cur[x] = relabel[cur[x]]
+        k = j
+        prev, cur = cur, prev
+    return spans, clusters, largest, total, squares
+
+
+if njit is not None:
+    find = njit(find)
+    strip = njit(strip)
+
+
+def run_strip(job):
+    ## Runs one strip in a worker process.
+    p, width, length, seed = job
+    counts = np.zeros(bins, dtype=np.int64)
+    spans, clusters, largest, total, squares = strip(1 - p, width, int(length),
+                                                     np.random.default_rng(seed), counts)
+    return p, bool(spans), int(clusters), int(largest), int(total), float(squares), counts
+
+
+def simulation_strips(densities, width, length, nrep=1, workers=None, seed=None):
+    """Run nrep strips 'width' wide and 'length' long at each density of mud
+    across a pool of worker processes, each strip with its own random
+    stream.  Returns for each density the number of strips spanned and the
+    cluster statistics added over its strips: the number of clusters, the
+    size of the largest, the sum of the sizes and of their squares, and the
+    counts of the sizes in bins of powers of two."""
+    entropy = np.random.SeedSequence(seed).entropy
+    jobs = [(p, width, length,
+             np.random.SeedSequence(entropy, spawn_key=(3, width, int(length),
+                                                        round(p * 10**6), j)))
+            for p in densities for j in range(int(nrep))]
+    stats = {p: {"spanned": 0, "clusters": 0, "largest": 0, "total": 0, "squares": 0.0,
+                 "counts": np.zeros(bins, dtype=np.int64)} for p in densities}
+    workers = workers or os.cpu_count()
+    with Pool(min(workers, len(jobs))) as pool:
+        for p, spans, clusters, largest, total, squares, counts in \
+                pool.imap_unordered(run_strip, jobs):
+            s = stats[p]
+            s["spanned"] += spans
+            s["clusters"] += clusters
+            s["largest"] = max(s["largest"], largest)
+            s["total"] += total
+            s["squares"] += squares
+            s["counts"] += counts
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m percolate.strips",
+                                     description="Spanning and clusters of trees on "
+                                                 "long strips of forest.")
+    parser.add_argument("--densities", type=float, nargs="+", required=True,
+                        help="densities of mud in the forest")
+    parser.add_argument("--width", type=int, default=1000, help="trees across the strip")
+    parser.add_argument("--length", type=float, default=10**6, help="rows of the strip")
+    parser.add_argument("--realisations", type=int, default=1, help="strips at each density")
+    parser.add_argument("--workers", type=int, help="processes, default every core")
+    parser.add_argument("--seed", type=int, help="seed of the random streams")
+    args = parser.parse_args(argv)
+    stats = simulation_strips(args.densities, args.width, args.length, args.realisations,
+                              args.workers, args.seed)
+    print("%8s %8s %12s %12s %12s %14s" % ("Density", "Spanned", "Clusters", "Largest",
+                                            "Mean_Size", "Weighted_Size"))
+    for p, s in stats.items():
+        print("%8g %8d %12d %12d %12.4g %14.4g" % (
+            p, s["spanned"], s["clusters"], s["largest"],
+            s["total"] / max(s["clusters"], 1), s["squares"] / max(s["total"], 1)))
+        # Sizes from 2**(b-1) to 2**b - 1, for every bin holding a cluster
+        print("         sizes by powers of two: " + " ".join(
+            str(2**(b - 1)) + ":" + str(c) for b, c in enumerate(s["counts"]) if c))
+
+
+if __name__ == '__main__':
+    main()
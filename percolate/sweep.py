@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Running the (model, size, realisations, density) cells of sweeps.
+"""
+## A sweep visits every density from 'start' down to 'stop' in steps of
+## 'step', for every grid size and number of realisations it is given.
+## Each cell is run once per invocation however many sweeps visit it, on
+## a pool of worker processes, with a random stream of its own so that the
+## results do not depend on the number of workers or on which sweeps asked
+## for the cell.
+import os
+import json
+import numpy as np
+from multiprocessing import Pool
+
+from . import droplet, forest, cache
+
+# Number of each model in the keys of the random streams
+models = {"droplet": 0, "forest": 1}
+engines = {"droplet": droplet, "forest": forest}
+
+# Settings of a sweep which are not given
+defaults = {"sizes": [10, 50, 100, 200, 400], "realisations": [100, 500, 1000, 2000, 4000],
+            "start": 1, "stop": 0, "step": 0.01, "plot": None, "excel": None,
+            "store": False}
+
+
+def densities(start=1, stop=0, step=0.01):
+    ## The densities visited by a sweep, from 'start' down to 'stop'.
+    n = int((start - stop) / step + 1e-9)
+    return [round(start - k * step, 10) for k in range(n + 1)]
+
+
+def cells(sweep):
+    ## The (model, size, realisations, density) cells visited by a sweep.
+    return [(sweep["model"], N, round(i), p)
+            for N in sweep["sizes"] for i in sweep["realisations"]
+            for p in densities(sweep["start"], sweep["stop"], sweep["step"])]
+
+
+def simulation(model, N, nrep, p, rng=None):
+    ## Runs nrep realisations of a model on an N by N grid with the fastest
+    ## engine available, returning the number of times that the bottom or
+    ## edge is reached and the total depth or number of cells burnt.
+    if model == "droplet":
+        return droplet.simulation(p, N, nrep, rng)
+    return forest.simulation(p, N, N, nrep, rng)
+
+
+def stream(cell, entropy):
+    ## The seed of a cell's random stream, a child of one SeedSequence keyed
+    ## by the model, size, realisations and density.
+    key = (models[cell[0]], cell[1], cell[2], round(cell[3] * 10**6))
+    return np.random.SeedSequence(entropy, spawn_key=key)
+
+
+def run_cell(job):
+    ## Runs the simulations for one cell in a worker process.
+    cell, seed = job
+    return cell, simulation(*cell, rng=np.random.default_rng(seed))
+
+
+def run(wanted, results=None, workers=None, seed=None, journal=None,
+        folder=None, limit=100 * 2**20):
+    """Run every cell in 'wanted' which is not already in 'results' across a
+    pool of worker processes, adding each to 'results' as it finishes.  Each
+    cell draws from its own stream, a child of one SeedSequence keyed by the
+    model, size, realisations and density.  With a journal every finished
+    cell is appended to it, and cells already in it are not run again, so an
+    interrupted invocation resumes where it stopped, as long as the rules,
+    the engines and the seed are those the journal was begun with.  With a
+    cache folder the cells already run with the same seed are read from it
+    instead, and when a seed is given every finished cell is added to it,
+    keeping it within 'limit' bytes.  Returns the results, a dictionary of
+    (NB, TD) keyed by cell."""
+    entropy, done = read_journal(journal, seed)
+    results = {} if results is None else results
+    results.update(done)
+    if folder:
+        for cell in set(wanted) - set(results):
+            result = cache.load(folder, cell, entropy)
+            if result is not None:
+                results[cell] = result
+    jobs = []
+    for cell in sorted(set(wanted) - set(results)):
+        jobs.append((cell, stream(cell, entropy)))
+    # Start the largest cells first so that no worker is left with them at the end.
+    jobs.sort(key=lambda job: job[0][1] * job[0][1] * job[0][2], reverse=True)
+    workers = workers or os.cpu_count()
+
+    def record(finished, log):
+        for cell, (NB, TD) in finished:
+            results[cell] = (NB, TD)
+            # without a seed the key can never be asked for again
+            if folder and seed is not None:
+                cache.save(folder, cell, entropy, (NB, TD))
+            if log:
+                model, N, i, p = cell
+                log.write(json.dumps({"entropy": entropy, "model": model, "size": N,
+                                      "realisations": i, "density": p,
+                                      "NB": NB, "TD": TD}) + "\n")
+                # the cell is on disk before the next one is taken
+                log.flush()
+                os.fsync(log.fileno())
+
+    log = open(journal, "a") if journal else None
+    if log and log.tell() == 0:
+        log.write(json.dumps(header(seed)) + "\n")
+    try:
+        if workers == 1 or len(jobs) <= 1:
+            record(map(run_cell, jobs), log)
+        else:
+            chunksize = max(1, len(jobs) // (4 * workers))
+            with Pool(min(workers, len(jobs))) as pool:
+                record(pool.imap_unordered(run_cell, jobs, chunksize), log)
+    finally:
+        if log:
+            log.close()
+        if folder:
+            cache.evict(folder, limit)
+    return results
+
+
+def header(seed=None):
+    ## The first line of a journal: the version of the rules and the engine
+    ## of each model, and the seed the journal was begun with.  The cells
+    ## themselves are keyed in each entry, so a sweep asking for more cells
+    ## carries on with the same journal.
+    return {"header": {"versions": {model: engines[model].version for model in models},
+                       "engines": {model: engines[model].engine() for model in models},
+                       "seed": seed}}
+
+
+def read_journal(journal, seed=None):
+    ## Reads the cells finished by earlier invocations.  Without a seed the
+    ## run carries on from the entropy recorded in the journal, or from fresh
+    ## entropy when there is no journal yet.  A journal begun with other
+    ## rules, another engine or another seed is moved aside to a '.old' file
+    ## and a fresh one is begun, so that its results are never mixed in.
+    entries = []
+    if journal and os.path.exists(journal):
+        with open(journal) as log:
+            text = log.read()
+        for line in text.splitlines():
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # a line cut short by a crash is simply run again
+                pass
+        if text and (not entries or entries[0] != header(seed)):
+            os.replace(journal, journal + ".old")
+            print("The journal " + journal + " was begun with other rules or "
+                  "another seed, so it was moved to " + journal + ".old")
+            entries = []
+        elif text and not text.endswith("\n"):
+            with open(journal, "a") as log:
+                log.write("\n")
+    entries = [e for e in entries if "header" not in e]
+    if seed is not None:
+        entropy = seed
+    elif entries:
+        entropy = entries[0]["entropy"]
+    else:
+        entropy = np.random.SeedSequence().entropy
+    results = {(e["model"], e["size"], e["realisations"], e["density"]): (e["NB"], e["TD"])
+               for e in entries if e["entropy"] == entropy}
+    return entropy, results
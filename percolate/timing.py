@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+Time spent in each phase of a block of simulations.
+"""
+## The seconds spent in, and number of passes through, each phase of the
+## current (grid size, realisations) block are added up by record(), and
+## printed and appended to the timings file by report() as the block ends.
+## pandas takes over a second to import, so it is imported by report().
+import json
+
+pd = None
+
+timings = {}
+counts = {}
+
+
+def clear():
+    ## Begins a new block.
+    timings.clear()
+    counts.clear()
+
+
+def record(phase, seconds, calls=1):
+    ## Adds the time spent in a phase to the current block.
+    timings[phase] = timings.get(phase, 0) + seconds
+    counts[phase] = counts.get(phase, 0) + calls
+
+
+def report(model, size, nrep, elapsed, filename="timings.jsonl"):
+    ## Prints the time spent in each phase of a block, with whatever is not
+    ## timed shown as 'other', and appends the block to the timings file.
+    global pd
+    if pd is None:
+        import pandas as pd
+    phases = dict(timings, other=max(elapsed - sum(timings.values()), 0))
+    calls = dict(counts, other=1)
+    table = pd.DataFrame({"Phase": list(phases),
+                          "Seconds": list(phases.values()),
+                          "Calls": [calls[k] for k in phases]})
+    table["Per_Call_ms"] = 1000 * table["Seconds"] / table["Calls"]
+    table["Share"] = table["Seconds"] / elapsed
+    print(table.to_string(index=False, float_format="%.4f"))
+    with open(filename, "a") as log:
+        log.write(json.dumps({"model": model, "size": size, "realisations": nrep,
+                              "seconds": elapsed,
+                              "phases": {k: {"seconds": phases[k], "calls": calls[k]}
+                                         for k in phases}}) + "\n")